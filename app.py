@@ -1,19 +1,42 @@
+import importlib
 import streamlit as st
-import memberlist_page
-import registration_page
-import edit_members
+from datetime import datetime
 from auth import authenticate
+from tracing import TRACING_ENABLED, is_admin, render_panel, rerun_trace, set_page, span
+from warmup import WARMUP_ENABLED, start_warmup
 
 
+# Page modules are imported by name once selected, so the login form shows
+# without loading pandas, gspread, Pillow and the other page dependencies
 PAGES = {
-    "Registration": registration_page,
-    "Member List": memberlist_page,
-    "Edit Member's Data": edit_members
+    "Registration": "registration_page",
+    "Member List": "memberlist_page",
+    "Edit Member's Data": "edit_members"
 }
 
+# While writes wait in the journal, the sidebar checks on them this often
+WRITES_POLL_SECONDS = 2
+
+
+def write_status(seen_pending):
+    # Writes journaled locally and not in Google Sheets yet. Once some have
+    # landed the whole page reruns, so it shows them.
+    from data import pending_writes
+    writes = pending_writes()
+    if writes['failed']:
+        st.error(f"{writes['failed']} change(s) could not be saved to Google Sheets: {writes['failed_error']}")
+    if writes['pending']:
+        st.info(f"{writes['pending']} change(s) waiting to sync to Google Sheets.")
+    if writes['pending'] < seen_pending:
+        st.rerun()
+
 def main():
     if 'refresh_counter' not in st.session_state:
         st.session_state['refresh_counter'] = 0
+
+    # Loads the data in the background while the login form is filled in
+    if WARMUP_ENABLED:
+        start_warmup()
     
 
     col1, col2 = st.columns([0.3, 0.7])
@@ -46,14 +69,39 @@ def main():
         </div>
         """, unsafe_allow_html=True)    
 
-    if authenticate():  # Checks if the user is authenticated
+    with span("authenticate"):
+        authenticated = authenticate()
+    if authenticated:  # Checks if the user is authenticated
         st.sidebar.title("Navigation")
         with st.sidebar.expander("Pages"):
             selection = st.sidebar.radio("Go to", list(PAGES.keys()))
-        page = PAGES[selection]
+        set_page(selection)
+        page = importlib.import_module(PAGES[selection])
+        from data import pending_writes, sync_status  # Loaded with the page anyway
+        offline_notice = st.container()
         page.app()
+
+        # Pages keep working from the copy already loaded when Sheets is down
+        status = sync_status()
+        if status['synced_at']:
+            synced_at = datetime.fromtimestamp(status['synced_at']).strftime('%d %b %Y %H:%M')
+            st.sidebar.caption(f"Data as of {synced_at}")
+        if status['error'] and status['synced_at']:
+            offline_notice.warning(
+                f"Google Sheets can't be reached right now ({status['error']}). "
+                f"Showing data as of {synced_at}; changes are kept and sent once the connection is back."
+            )
+
+        # Polled in a fragment, so pages never wait for the journal
+        pending = pending_writes()['pending']
+        with st.sidebar:
+            st.fragment(write_status, run_every=WRITES_POLL_SECONDS if pending else None)(pending)
     else:
         st.warning("Please log in to continue")
 
 if __name__ == "__main__":
-    main()
+    with rerun_trace():
+        main()
+    # Drawn after the run is recorded, so it includes this one
+    if TRACING_ENABLED and st.session_state.get('authenticated') and is_admin(st.session_state.get('username')):
+        render_panel()
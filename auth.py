@@ -16,6 +16,7 @@ def authenticate():
         if submit:
             if check_credentials(username, password):
                 st.session_state['authenticated'] = True
+                st.session_state['username'] = username
                 # Increment refresh_counter to refresh connection after login
                 st.session_state['refresh_counter'] = st.session_state.get('refresh_counter', 0) + 1
                 st.success("Logged in successfully!")
@@ -0,0 +1,64 @@
+"""
+Benchmark of cold-start import times: the app up to the login form, and
+each page module. Every measurement runs in a fresh interpreter, as after
+the container wakes up; Streamlit itself is imported first and not counted.
+
+Usage:
+    python benchmarks/bench_import_time.py [--repeat 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = {
+    'login form (app)': 'app',
+    'Registration': 'registration_page',
+    'Member List': 'memberlist_page',
+    "Edit Member's Data": 'edit_members'
+}
+
+# Dependencies the login form should not load
+HEAVY_MODULES = ['pandas', 'numpy', 'gspread', 'google.oauth2', 'PIL', 'cloudinary.uploader']
+
+_PROBE = """
+import json, sys, time
+import streamlit
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'loaded': [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+def measure(module):
+    output = subprocess.run(
+        [sys.executable, '-c', _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=_ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"Import time after streamlit, median of {args.repeat} fresh interpreters")
+    for label, module in TARGETS.items():
+        runs = [measure(module) for _ in range(args.repeat)]
+        median_ms = statistics.median(run['seconds'] for run in runs) * 1000
+        loaded = ', '.join(runs[0]['loaded']) or '-'
+        print(f"  {label:20s} {median_ms:8.1f} ms   heavy modules loaded: {loaded}")
+
+    # The login form must stay light
+    login = measure(TARGETS['login form (app)'])
+    assert not login['loaded'], f"The login form loads {', '.join(login['loaded'])}"
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+"""
+Benchmark of the member list pipeline on synthetic data of increasing size:
+loading and parsing the tables, restoring them from the local snapshot as
+after a restart, process_member_data, the filter/search/sort
+block and a headless render of the Member List page, plus the memory the
+shared tables take.
+
+Runs offline on the memory storage backend. The JSON report can be kept
+per commit and compared with --baseline to catch regressions before deploy.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--sizes 500,2000,5000] [--output report.json]
+    python benchmarks/bench_pipeline.py --baseline old.json [--tolerance 0.25]
+"""
+import argparse
+import atexit
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# The app reads its settings at import time
+_WORKDIR = tempfile.mkdtemp(prefix='brotot-bench-')
+atexit.register(shutil.rmtree, _WORKDIR, ignore_errors=True)
+os.environ.update({
+    'BROTOT_STORAGE_BACKEND': 'memory',
+    'BROTOT_STORAGE_PATH': os.path.join(_WORKDIR, 'workbook.json'),
+    'BROTOT_REPLICA_ENABLED': 'false',
+    'BROTOT_JOURNAL_PATH': os.path.join(_WORKDIR, 'journal.sqlite3')
+})
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _ROOT)
+
+import pandas as pd  # noqa: E402
+import streamlit as st  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+import data  # noqa: E402
+from memberlist_page import member_positions  # noqa: E402
+from membership import process_member_data  # noqa: E402
+from search import MemberSearchIndex  # noqa: E402
+from snapshot import SheetSnapshot  # noqa: E402
+from storage import get_storage  # noqa: E402
+from synthetic import make_workbook  # noqa: E402
+
+SECRETS = {'cloudinary': {'cloud_name': 'demo', 'api_key': 'key', 'api_secret': 'secret'}}
+QUERY = 'kadek putr'
+
+
+def render_member_list():
+    import memberlist_page
+    memberlist_page.app()
+
+
+def filter_search_sort(processed_df, search_index, query, filter_tag='All', ascending=True):
+    # Same call as the filter block of memberlist_page
+    return member_positions(processed_df, filter_tag, ascending, search_index.scores(query) if query else None)
+
+
+def memory_mb(*frames):
+    return round(sum(frame.memory_usage(deep=True).sum() for frame in frames) / 2 ** 20, 1)
+
+
+def best_of(func, repeat, *args):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def load_tables():
+    data._table_store.clear()  # Start from an empty store: full download and parse
+    return data.get_member_data()
+
+
+def restore_snapshot(snapshot):
+    store = data._TableStore()  # A restarted server's empty store
+    store.restore(snapshot, data.data_version())
+    return store
+
+
+def render(repeat):
+    # First run of a new session, then a rerun such as a widget change
+    first_runs, reruns = [], []
+    for _ in range(repeat):
+        at = AppTest.from_function(render_member_list, default_timeout=300)
+        for section, values in SECRETS.items():
+            at.secrets[section] = values
+        start = time.perf_counter()
+        at.run()
+        first_runs.append(time.perf_counter() - start)
+        if at.exception:
+            raise RuntimeError(f"Member List failed to render: {at.exception[0].value}")
+        start = time.perf_counter()
+        at.run()
+        reruns.append(time.perf_counter() - start)
+    return min(first_runs), min(reruns)
+
+
+def run_size(n_members, n_transactions, repeat, seed):
+    workbook = make_workbook(n_members, n_transactions, seed=seed)
+    with open(os.environ['BROTOT_STORAGE_PATH'], 'w', encoding='utf-8') as file:
+        json.dump(workbook, file)
+    st.cache_resource.clear()  # New storage, tables and search index
+    get_storage()
+
+    load_time, (members_df, transactions_df) = best_of(load_tables, repeat)
+    snapshot = SheetSnapshot(os.path.join(_WORKDIR, f'snapshot-{n_members}'))
+    snapshot.save(*data._table_store().replica_tables())
+    restore_time, _ = best_of(restore_snapshot, repeat, snapshot)
+    process_time, processed_df = best_of(process_member_data, repeat, members_df, transactions_df)
+    index_time, search_index = best_of(MemberSearchIndex, repeat, members_df)
+    filter_time, _ = best_of(filter_search_sort, repeat, processed_df, search_index, '')
+    search_time, found = best_of(filter_search_sort, repeat, processed_df, search_index, QUERY)
+    first_render_time, rerender_time = render(repeat)
+
+    return {
+        'members': len(members_df),
+        'transactions': len(transactions_df),
+        'search_matches': len(found),
+        'memory_mb': {
+            'tables': memory_mb(members_df, transactions_df),
+            'processed': memory_mb(processed_df)
+        },
+        'timings_ms': {
+            'load_tables': round(load_time * 1000, 1),
+            'restore_snapshot': round(restore_time * 1000, 1),
+            'process_member_data': round(process_time * 1000, 1),
+            'build_search_index': round(index_time * 1000, 1),
+            'filter_sort': round(filter_time * 1000, 1),
+            'filter_search_sort': round(search_time * 1000, 1),
+            'render_first_run': round(first_render_time * 1000, 1),
+            'render_rerun': round(rerender_time * 1000, 1)
+        }
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'streamlit': st.__version__,
+        'machine': platform.machine()
+    }
+
+
+def compare(report, baseline, tolerance):
+    """Prints timing changes against a baseline report and returns the regressions."""
+    regressions = []
+    for size, result in report['results'].items():
+        old = baseline['results'].get(size)
+        if old is None:
+            continue
+        print(f"{size} members vs baseline {baseline['environment'].get('commit')}:")
+        for name, value in result['timings_ms'].items():
+            old_value = old['timings_ms'].get(name)
+            if not old_value:
+                continue
+            ratio = value / old_value
+            flag = "  REGRESSION" if ratio > 1 + tolerance else ""
+            print(f"  {name:22s} {old_value:9.1f} -> {value:9.1f} ms  ({ratio:5.2f}x){flag}")
+            if flag:
+                regressions.append((size, name))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='500,2000,5000', help="Member counts, comma separated")
+    parser.add_argument('--transactions-per-member', type=int, default=60)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write the JSON report to this file")
+    parser.add_argument('--baseline', help="Earlier JSON report to compare with")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Slowdown flagged as a regression")
+    args = parser.parse_args()
+
+    report = {
+        'environment': environment(),
+        'parameters': {
+            'transactions_per_member': args.transactions_per_member,
+            'repeat': args.repeat,
+            'seed': args.seed,
+            'search_query': QUERY
+        },
+        'results': {}
+    }
+    for n_members in [int(size) for size in args.sizes.split(',')]:
+        result = run_size(n_members, n_members * args.transactions_per_member, args.repeat, args.seed)
+        report['results'][str(n_members)] = result
+        timings = ', '.join(f"{name} {value:.1f}" for name, value in result['timings_ms'].items())
+        print(f"{result['members']} members / {result['transactions']} transactions (ms, best of {args.repeat}): {timings}")
+        print(f"  memory: tables {result['memory_mb']['tables']} MB, processed {result['memory_mb']['processed']} MB")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2, sort_keys=True)
+            file.write('\n')
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            regressions = compare(report, json.load(file), args.tolerance)
+        if regressions:
+            sys.exit(f"{len(regressions)} timing(s) regressed by more than {args.tolerance:.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark of images.prepare_photo against re-encoding the camera photo at
+full resolution, as the upload helpers used to do.
+
+Usage:
+    python benchmarks/bench_prepare_photo.py [--width 4032] [--height 3024]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from images import MAX_PHOTO_SIZE, prepare_photo  # noqa: E402
+
+
+def make_photo(width, height, seed=0):
+    # Smooth gradients plus sensor-like noise, stored sideways with an EXIF
+    # orientation tag the way phones save portrait shots
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = np.stack([x * 255 // width, y * 255 // height, (x + y) * 255 // (width + height)], axis=-1)
+    pixels = np.clip(pixels + rng.normal(0, 12, pixels.shape), 0, 255).astype('uint8')
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format='JPEG', quality=95, exif=exif)
+    return buffer.getvalue()
+
+
+def make_transparent_png(width, height):
+    image = Image.new('RGBA', (width, height), (200, 30, 30, 0))
+    image.paste((30, 30, 200, 255), (width // 4, height // 4, width * 3 // 4, height * 3 // 4))
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def legacy_encode(photo):
+    output = io.BytesIO()
+    Image.open(io.BytesIO(photo)).save(output, format='JPEG')
+    return output.tell()
+
+
+def prepared_encode(photo):
+    return prepare_photo(io.BytesIO(photo), io.BytesIO())
+
+
+def best_of(func, repeat, *args):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--width', type=int, default=4032)
+    parser.add_argument('--height', type=int, default=3024)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    photo = make_photo(args.width, args.height)
+    legacy_time, legacy_bytes = best_of(legacy_encode, args.repeat, photo)
+    prepared_time, stats = best_of(prepared_encode, args.repeat, photo)
+
+    # Portrait after applying the EXIF rotation, and inside the box
+    width, height = stats['size']
+    assert height > width and width <= MAX_PHOTO_SIZE[0] and height <= MAX_PHOTO_SIZE[1], stats['size']
+
+    # Transparent PNGs used to fail ("cannot write mode RGBA as JPEG")
+    prepared_encode(make_transparent_png(1200, 1600))
+
+    print(f"{args.width}x{args.height} camera JPEG, {len(photo) / 1024:.0f} KB (best of {args.repeat})")
+    print(f"  full-size re-encode : {legacy_time * 1000:7.1f} ms  {legacy_bytes / 1024:8.0f} KB")
+    print(f"  prepare_photo       : {prepared_time * 1000:7.1f} ms  {stats['prepared_bytes'] / 1024:8.0f} KB  ({width}x{height})")
+    print(f"  upload size         : {legacy_bytes / stats['prepared_bytes']:7.1f}x smaller")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Benchmark of membership.process_member_data against the previous
+row-by-row implementation, checked against a plain Python replay of
+every member's history.
+
+Usage:
+    python benchmarks/bench_process_member_data.py [--members 10000] [--transactions 500000]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from membership import membership_types, process_member_data, transaction_durations  # noqa: E402
+
+
+def make_tables(n_members, n_transactions, seed=0):
+    rng = np.random.default_rng(seed)
+    members_df = pd.DataFrame({
+        'member_id': np.arange(1, n_members + 1),
+        'nick_name': [f"member{i}" for i in range(1, n_members + 1)],
+        'full_name': [f"Member Number {i}" for i in range(1, n_members + 1)],
+    })
+    # A few members never paid, so the "no transaction" path is exercised
+    member_ids = rng.integers(1, int(n_members * 0.98) + 1, n_transactions)
+    days_ago = rng.integers(0, 3 * 365, n_transactions)
+    transactions_df = pd.DataFrame({
+        'transaction_id': np.arange(n_transactions).astype(str),
+        'member_id': member_ids,
+        'membership_types_id': np.ones(n_transactions, dtype='int64'),
+        'transaction_date': pd.Timestamp(datetime.now().date()) - pd.to_timedelta(days_ago, unit='D'),
+    })
+    return members_df, transactions_df
+
+
+def legacy_process_member_data(members_df, transactions_df):
+    # The implementation memberlist_page used before the vectorized engine
+    membership_type_by_id = {v['id']: {'name': k, 'duration': v['duration']} for k, v in membership_types.items()}
+    transactions_df = transactions_df.sort_values(by='transaction_date')
+    last_transactions = transactions_df.groupby('member_id').last().reset_index()
+
+    members_with_last_tx = pd.merge(members_df, last_transactions[['member_id', 'transaction_date', 'membership_types_id']], on='member_id', how='left')
+
+    def calculate_expiration(row):
+        last_transaction_date = row['transaction_date']
+        membership_type_id = row['membership_types_id']
+        if pd.isnull(last_transaction_date) or pd.isnull(membership_type_id):
+            return None
+        duration_days = membership_type_by_id.get(membership_type_id, {}).get('duration', 0)
+        return last_transaction_date + timedelta(days=duration_days)
+
+    members_with_last_tx['membership_expiration'] = members_with_last_tx.apply(calculate_expiration, axis=1)
+
+    today = datetime.now().date()
+    members_with_last_tx['days_left'] = members_with_last_tx['membership_expiration'].apply(lambda x: (x.date() - today).days if pd.notnull(x) else None)
+
+    def assign_membership_tag(days_left):
+        if days_left is None or days_left < 0:
+            return "Red"
+        elif days_left <= 3:
+            return "Yellow"
+        else:
+            return "Green"
+
+    members_with_last_tx['membership_tag'] = members_with_last_tx['days_left'].apply(assign_membership_tag)
+    return members_with_last_tx
+
+
+def reference_expiration(transactions_df):
+    # Straightforward replay of the stacking rule, one transaction at a time
+    ordered = transactions_df.assign(duration=transaction_durations(transactions_df))
+    ordered = ordered.sort_values(['member_id', 'transaction_date'], kind='stable')
+    expiration = {}
+    for member_id, start, duration in zip(ordered['member_id'], ordered['transaction_date'], ordered['duration']):
+        current = expiration.get(member_id)
+        expiration[member_id] = max(current, start) + timedelta(days=int(duration)) if current is not None else start + timedelta(days=int(duration))
+    return pd.Series(expiration, name='membership_expiration')
+
+
+def best_of(func, repeat, *args):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--members', type=int, default=10_000)
+    parser.add_argument('--transactions', type=int, default=500_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    members_df, transactions_df = make_tables(args.members, args.transactions)
+
+    legacy_time, legacy = best_of(legacy_process_member_data, args.repeat, members_df, transactions_df)
+    vector_time, vector = best_of(process_member_data, args.repeat, members_df, transactions_df)
+
+    reference_time, reference = best_of(reference_expiration, 1, transactions_df)
+
+    # The old code only looked at the last transaction, so it agrees on the
+    # last transaction picked but not on stacked expiry dates
+    paid = legacy['transaction_date'].notna()
+    pd.testing.assert_series_equal(
+        legacy.loc[paid, 'transaction_date'], vector.loc[paid, 'transaction_date'],
+        check_dtype=False
+    )
+    pd.testing.assert_series_equal(
+        reference.sort_index(),
+        vector.loc[paid].set_index('member_id')['membership_expiration'].sort_index(),
+        check_dtype=False, check_names=False, check_index_type=False
+    )
+
+    print(f"{args.members} members / {args.transactions} transactions (best of {args.repeat})")
+    print(f"  row-by-row (last transaction only) : {legacy_time * 1000:9.1f} ms")
+    print(f"  python replay of full history      : {reference_time * 1000:9.1f} ms")
+    print(f"  vectorized full history            : {vector_time * 1000:9.1f} ms")
+    print(f"  speedup over row-by-row            : {legacy_time / vector_time:9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
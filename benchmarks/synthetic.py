@@ -0,0 +1,89 @@
+"""
+Seeded synthetic spreadsheet for the benchmarks: Members and Transactions
+worksheets with the real column layout, as the storage backends return them.
+Values come from the app's own choices and ID formats, so every page can
+open the members and duplicate renewals are caught as in production.
+"""
+import os
+import sys
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from membership import genders, membership_types, payment_types, workout_times  # noqa: E402
+from storage import EMPTY_WORKBOOK  # noqa: E402
+
+NAMES = ['Kadek', 'Putu', 'Made', 'Komang', 'Wayan', 'Ketut', 'Gede', 'Ayu', 'Nyoman', 'Dewi', 'Agung', 'Sari']
+FAMILY_NAMES = ['Putra', 'Putri', 'Wijaya', 'Santika', 'Pratama', 'Adnyana', 'Suartana', 'Dewi', 'Yasa', 'Mahendra']
+GOALS = ['strength', 'weight loss', 'cardio', 'muscle gain']
+
+
+def make_workbook(n_members, n_transactions, seed=0, today=None):
+    """
+    Builds a synthetic workbook.
+
+    Members join over the last three years and renew about monthly, a few
+    never pay, and the oldest rows have no duration_days, like rows written
+    before it was recorded. Like the app, a member has at most one
+    transaction per day, with the transaction_id {date}-{member_id}.
+
+    Args:
+        n_members (int): Rows in Members.
+        n_transactions (int): Transactions drawn; those falling on a day the
+            member already paid are left out, so a few less rows are made.
+        seed (int): Random seed; the same seed gives the same workbook.
+        today (date): Date the history ends on, defaults to today.
+
+    Returns:
+        dict: Worksheet name -> rows of cell text, header first.
+    """
+    rng = np.random.default_rng(seed)
+    today = today or date.today()
+
+    members = [list(EMPTY_WORKBOOK['Members'][0])]
+    first_names = rng.choice(NAMES, n_members)
+    family_names = rng.choice(FAMILY_NAMES, n_members)
+    for member_id, (first, family) in enumerate(zip(first_names, family_names), 1):
+        members.append([
+            str(member_id),
+            f"{first}{member_id}",
+            f"{first} {family} {member_id}",
+            genders[0] if rng.random() < 0.6 else genders[1],
+            (date(1970, 1, 1) + timedelta(days=int(rng.integers(0, 35 * 365)))).isoformat(),
+            f"62812{member_id:08d}",
+            '' if rng.random() < 0.9 else 'knee injury',
+            GOALS[int(rng.integers(len(GOALS)))],
+            workout_times[int(rng.integers(len(workout_times)))],
+            f"https://res.cloudinary.com/demo/image/upload/v1/gym_members/m{member_id}.jpg"
+        ])
+
+    # Appended in date order, as the desk records them; the first payment of
+    # each member is their signup
+    payers = max(1, int(n_members * 0.98))
+    member_ids = rng.integers(1, payers + 1, n_transactions)
+    days_ago = np.sort(rng.integers(0, 3 * 365, n_transactions))[::-1]
+    membership_type = next(iter(membership_types.values()))
+    payment_methods = [payment_type['payment_method'] for payment_type in payment_types.values()]
+    transactions = [list(EMPTY_WORKBOOK['Transactions'][0])]
+    recorded = set()
+    for number, (member_id, ago) in enumerate(zip(member_ids, days_ago)):
+        day = today - timedelta(days=int(ago))
+        transaction_id = f"{day:%Y%m%d}-{member_id}"
+        if transaction_id in recorded:
+            continue
+        signup = member_id not in recorded
+        recorded.update((transaction_id, member_id))
+        transactions.append([
+            transaction_id,
+            str(member_id),
+            str(membership_type['id']),
+            'signup' if signup else 'renewal',
+            '100' if signup else '80',
+            payment_methods[number % len(payment_methods)],
+            day.isoformat(),
+            '',
+            '' if ago > 2 * 365 else str(membership_type['duration'])
+        ])
+    return {'Members': members, 'Transactions': transactions}
@@ -0,0 +1,32 @@
+import os
+import streamlit as st
+
+
+def get_setting(section, key, default=None):
+    """
+    Reads an optional tuning setting.
+
+    An environment variable named BROTOT_<SECTION>_<KEY> wins over the
+    [section] key entry in st.secrets, which wins over the default.
+
+    Args:
+        section (str): Secrets section, e.g. 'cache'.
+        key (str): Setting name inside the section, e.g. 'ttl_seconds'.
+        default: Value used when the setting is not configured. Its type is
+            also used to convert values coming from the environment.
+
+    Returns:
+        The configured value, or default.
+    """
+    env_value = os.environ.get(f"BROTOT_{section}_{key}".upper())
+    if env_value is not None:
+        if isinstance(default, bool):
+            return env_value.strip().lower() in ("1", "true", "yes", "on")
+        if default is not None:
+            return type(default)(env_value)
+        return env_value
+
+    try:
+        return st.secrets[section][key]
+    except (KeyError, FileNotFoundError):
+        return default
@@ -0,0 +1,47 @@
+import streamlit as st
+import gspread
+from google.oauth2 import service_account
+from tracing import count_http_responses, traced
+
+SCOPES = [
+    "https://spreadsheets.google.com/feeds",
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive.file",
+    "https://www.googleapis.com/auth/drive"
+]
+
+
+# Authorized client shared by every session of this server process.
+# gspread wraps the credentials in an AuthorizedSession, which fetches a new
+# access token by itself whenever the current one expires.
+@traced()
+@st.cache_resource(show_spinner=False)
+def init_connection():
+    creds = service_account.Credentials.from_service_account_info(
+        st.secrets["gcp_service_account"],
+        scopes=SCOPES
+    )
+    client = gspread.authorize(creds)
+    count_http_responses(client.http_client.session, 'sheets')
+    return client
+
+
+@st.cache_resource(show_spinner=False)
+def get_spreadsheet():
+    spreadsheet_id = st.secrets["google_sheets"]["spreadsheet_id"]
+    return init_connection().open_by_key(spreadsheet_id)
+
+
+@st.cache_resource(show_spinner=False)
+def get_worksheet(title):
+    """
+    Returns the shared handle of a worksheet, opened once per process.
+
+    Args:
+        title (str): Worksheet name, e.g. 'Members' or 'Transactions'.
+
+    Returns:
+        gspread.Worksheet: Cached worksheet handle.
+    """
+    return get_spreadsheet().worksheet(title)
+
@@ -0,0 +1,1018 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from contextlib import nullcontext
+import streamlit as st
+import numpy as np
+import pandas as pd
+from google.auth.exceptions import TransportError
+from gspread.exceptions import APIError, WorksheetNotFound
+from gspread.utils import rowcol_to_a1
+from config import get_setting
+from images import delete_photo
+from journal import JOURNAL_PATH, WriteJournal
+from replica import REPLICA_ENABLED, REPLICA_PATH, SYNC_INTERVAL_SECONDS, SheetReplica
+from snapshot import SNAPSHOT_ENABLED, SNAPSHOT_PATH, SheetSnapshot
+from storage import WorksheetExists, get_storage
+from tracing import background_trace, traced
+
+# How long a loaded copy of the sheets may be served before it is refetched.
+# Writes made through this app invalidate the cache immediately; the TTL only
+# bounds how stale edits made directly in Google Sheets can get.
+CACHE_TTL_SECONDS = get_setting("cache", "ttl_seconds", 300)
+
+# Fetch only the rows appended to Transactions since the previous load.
+INCREMENTAL_TRANSACTIONS = get_setting("cache", "incremental_transactions", True)
+# A delta only re-checks the last few ingested rows, so the whole sheet is
+# fetched and compared with the ingested rows at least this often, to pick up
+# older rows corrected by hand
+FULL_SYNC_SECONDS = get_setting("cache", "full_sync_seconds", 900)
+
+
+# After a failed load, how long to keep serving the copy already loaded
+# before trying Google Sheets again
+OFFLINE_RETRY_SECONDS = 30
+
+# Worksheet holding the last member_id handed out
+COUNTERS_SHEET = 'Counters'
+
+_LOGGER = logging.getLogger(__name__)
+
+# The loaded tables are shared by every session. With copy-on-write, frames
+# derived from them (selections, filters, merges) share their memory until
+# written to, and writing to a derived frame never changes the shared one.
+pd.set_option('mode.copy_on_write', True)
+
+
+class _DataVersion:
+    """Process-wide counter bumped by every write to the spreadsheet."""
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def bump(self):
+        with self._lock:
+            self.value += 1
+            return self.value
+
+
+@st.cache_resource(show_spinner=False)
+def _data_version():
+    return _DataVersion()
+
+
+def data_version():
+    return _data_version().value
+
+
+def invalidate():
+    """Marks the cached tables as stale for every session after a write."""
+    return _data_version().bump()
+
+
+# Declared layout of each worksheet. Every column is parsed in one pass
+# straight from the column-major values returned by the Sheets API; columns
+# not listed here are kept as strings. 'category' is for columns with a few
+# distinct values.
+SCHEMAS = {
+    'Members': {
+        'dtypes': {
+            'member_id': 'int',
+            'nick_name': 'str',
+            'full_name': 'str',
+            'gender': 'category',
+            'birth_date': 'str',
+            'phone_number': 'str',
+            'medical_info': 'str',
+            'fitness_goal': 'str',
+            'preferred_workout_time': 'str',
+            'photo_url': 'str'
+        },
+        # Rows missing a valid value in these columns are dropped
+        'required': ['member_id']
+    },
+    'Transactions': {
+        'dtypes': {
+            'transaction_id': 'str',
+            'member_id': 'int',
+            'membership_types_id': 'int',
+            'transaction_type': 'category',
+            'amount': 'float',
+            'payment_method': 'category',
+            'transaction_date': 'date',
+            'note': 'str',
+            'duration_days': 'float'  # Blank on rows written before it was recorded
+        },
+        'required': ['member_id', 'membership_types_id', 'transaction_date']
+    }
+}
+
+
+# In-memory types: 32-bit IDs, categoricals, and Arrow-backed strings, which
+# take a fraction of the memory of Python str objects
+_PANDAS_DTYPES = {'int': 'int32', 'float': 'float64', 'category': 'category', 'str': 'string[pyarrow]'}
+
+
+def _compact_dtypes(sheet, columns):
+    dtypes = SCHEMAS[sheet]['dtypes']
+    return {
+        name: _PANDAS_DTYPES[dtypes.get(name, 'str')]
+        for name in columns if dtypes.get(name, 'str') != 'date'
+    }
+
+
+def _concat_tables(table, new_rows):
+    # Give categoricals the same categories first, or concat turns them into
+    # plain objects. The shared table itself is never modified.
+    for name in table.columns:
+        if isinstance(table[name].dtype, pd.CategoricalDtype) and name in new_rows:
+            extra = new_rows[name].cat.categories.difference(table[name].cat.categories)
+            if len(extra):
+                table = table.assign(**{name: table[name].cat.add_categories(extra)})
+            new_rows = new_rows.assign(**{name: new_rows[name].cat.set_categories(table[name].cat.categories)})
+    return pd.concat([table, new_rows], ignore_index=True)
+
+
+def _pad_columns(columns, width):
+    # Sheets trims trailing empty cells from every column (and drops trailing
+    # empty columns), so square the block up to width x longest column
+    columns = list(columns[:width]) + [[]] * (width - len(columns))
+    height = max((len(column) for column in columns), default=0)
+    return [list(column) + [''] * (height - len(column)) for column in columns]
+
+
+def _trim(header):
+    while header and header[-1] == '':
+        header = header[:-1]
+    return header
+
+
+def _split_header(columns):
+    # The first cell of every column holds its name
+    header = [column[0] if column else '' for column in columns]
+    return header, _pad_columns([column[1:] for column in columns], len(header))
+
+
+def _table_frame(sheet, header, columns):
+    """
+    Builds a typed DataFrame from the column-major values of a worksheet.
+
+    Args:
+        sheet (str): Worksheet name, used to look up its schema.
+        header (list): Column names, in sheet order.
+        columns (list): One list of raw cell values per header entry.
+
+    Returns:
+        pd.DataFrame: Typed table with invalid rows dropped.
+    """
+    schema = SCHEMAS[sheet]
+    missing = [name for name in schema['required'] if name not in header]
+    if missing:
+        raise ValueError(f"Worksheet '{sheet}' is missing required columns: {', '.join(missing)}")
+
+    # Optional schema columns the sheet does not have yet come out blank
+    height = len(columns[0]) if columns else 0
+    blank_columns = [(name, [''] * height) for name in schema['dtypes'] if name not in header]
+
+    data = {}
+    for name, values in list(zip(header, columns)) + blank_columns:
+        dtype = schema['dtypes'].get(name, 'str')
+        if dtype in ('int', 'float'):
+            data[name] = pd.to_numeric(pd.Series(values, dtype=object), errors='coerce')
+        elif dtype == 'date':
+            data[name] = pd.to_datetime(pd.Series(values, dtype=object), errors='coerce')
+        else:
+            data[name] = pd.Series(values, dtype=object)
+    table = pd.DataFrame(data)
+
+    table = table.dropna(subset=schema['required'])
+    return table.astype(_compact_dtypes(sheet, table.columns))
+
+
+def _columns_checksum(columns):
+    digest = hashlib.sha1()
+    for column in columns:
+        digest.update(json.dumps(column).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _rows_checksum(columns, first_row):
+    # Order-sensitive sum of per-row hashes (mod 2**64): the checksum of rows
+    # appended later adds up with the one of the rows before them, so a full
+    # fetch can be compared with all the rows ingested so far
+    if not columns or not columns[0]:
+        return 0
+    rows = np.array(['\x1f'.join(row) for row in zip(*columns)], dtype=object)
+    row_hashes = pd.util.hash_array(rows, categorize=False)
+    positions = pd.util.hash_array(np.arange(first_row, first_row + len(rows), dtype='int64'))
+    return int((row_hashes ^ positions).sum(dtype='uint64'))
+
+
+class _TransactionsSync:
+    """
+    Incrementally mirrors the append-only Transactions sheet.
+
+    The app only ever appends to Transactions, so after the first full load
+    only rows below the last ingested one are fetched. Each delta request
+    re-reads the header and the last few ingested rows; if they no longer
+    match what was ingested (the sheet was edited or rows were removed by
+    hand), the whole sheet is reloaded instead. Edits to older rows are
+    caught by fetching the whole sheet every FULL_SYNC_SECONDS: it is only
+    reloaded if a checksum of its rows differs from the one of the ingested
+    rows, otherwise just the new rows are appended.
+    """
+
+    OVERLAP_ROWS = 3
+
+    def __init__(self):
+        self.header = None
+        self.row_count = 0  # Sheet rows ingested, header included
+        self.tail = []  # Raw columns of the last OVERLAP_ROWS ingested rows
+        self.transactions_df = None
+        self.generation = 0  # Bumped by every full reload
+        self.checksum = 0  # _rows_checksum() of the ingested rows
+        self.checked_at = 0.0  # time.time() the whole sheet was last fetched
+
+    def state(self):
+        """Returns what restore() needs to resume syncing, as plain data."""
+        return {
+            'header': self.header, 'row_count': self.row_count, 'tail': self.tail, 'generation': self.generation,
+            'checksum': self.checksum, 'checked_at': self.checked_at
+        }
+
+    def restore(self, state, transactions_df):
+        self.header = state['header']
+        self.row_count = state['row_count']
+        self.tail = state['tail']
+        self.generation = state['generation']
+        self.checksum = state.get('checksum')  # None before it was saved: the next check reloads
+        self.checked_at = state.get('checked_at', 0.0)
+        self.transactions_df = transactions_df
+
+    def ranges(self, full=False):
+        """Returns the ranges the next sync needs to fetch."""
+        if full or self.transactions_df is None or time.time() - self.checked_at >= FULL_SYNC_SECONDS:
+            return ['Transactions']
+        last_col = rowcol_to_a1(1, len(self.header)).rstrip('1')
+        start_row = self.row_count - len(self.tail[0]) + 1
+        # The whole first row, so columns added by hand also force a reload
+        return ["Transactions!1:1", f"Transactions!A{start_row}:{last_col}"]
+
+    def apply(self, value_ranges):
+        """
+        Ingests the values fetched for ranges().
+
+        Returns:
+            bool: False when a delta shows the sheet was edited by hand and
+            a full reload is needed.
+        """
+        if len(value_ranges) == 1:
+            header, columns = _split_header(value_ranges[0])
+            self.checked_at = time.time()
+            if self._unchanged(header, columns):
+                new_columns = [column[self.row_count - 1:] for column in columns]
+                if new_columns[0]:
+                    self._append(new_columns)
+                return True
+            self.header = header
+            self.row_count = len(columns[0]) + 1 if columns else 1
+            self.tail = [column[-self.OVERLAP_ROWS:] for column in columns]
+            self.checksum = self._checksum(columns, 2)
+            self.transactions_df = _table_frame('Transactions', header, columns)
+            self.generation += 1
+            return True
+
+        header_range, delta_range = value_ranges
+        header, _ = _split_header(header_range)
+        columns = _pad_columns(delta_range, len(self.header))
+        overlap_size = len(self.tail[0])
+        overlap = [column[:overlap_size] for column in columns]
+        new_columns = [column[overlap_size:] for column in columns]
+        if _trim(header) != _trim(self.header) or _columns_checksum(overlap) != _columns_checksum(self.tail):
+            return False
+
+        if new_columns[0]:
+            self._append(new_columns)
+        return True
+
+    def _unchanged(self, header, columns):
+        # Whether a full fetch still starts with exactly the ingested rows
+        ingested = self.row_count - 1
+        return (
+            self.transactions_df is not None and ingested > 0 and columns
+            and _trim(header) == _trim(self.header) and len(columns[0]) >= ingested
+            and self._checksum([column[:ingested] for column in columns], 2) == self.checksum
+        )
+
+    def _checksum(self, columns, first_row):
+        # Blank columns past the header do not count
+        return _rows_checksum(columns[:len(_trim(self.header))], first_row)
+
+    def append_local(self, row_number, header, rows):
+        """
+        Ingests rows this process just appended, without reading them back.
+
+        Args:
+            row_number (int): Sheet row the first appended row landed on.
+            header (list): Column names the rows were written with.
+            rows (list): The written rows, each a list of strings.
+
+        Returns:
+            bool: False when the rows do not directly follow the ingested
+            ones (or the layout changed), so a normal sync is needed.
+        """
+        if self.transactions_df is None or row_number != self.row_count + 1 or _trim(header) != _trim(self.header):
+            return False
+        width = len(self.header)
+        rows = [list(row[:width]) + [''] * (width - len(row)) for row in rows]
+        self._append([list(column) for column in zip(*rows)])
+        return True
+
+    def _append(self, new_columns):
+        if self.checksum is not None:
+            self.checksum = (self.checksum + self._checksum(new_columns, self.row_count + 1)) % 2 ** 64
+        self.transactions_df = _concat_tables(
+            self.transactions_df, _table_frame('Transactions', self.header, new_columns)
+        )
+        self.row_count += len(new_columns[0])
+        self.tail = [(old + new)[-self.OVERLAP_ROWS:] for old, new in zip(self.tail, new_columns)]
+
+
+def _restore_dtypes(sheet, table):
+    # Values read back from the SQLite replica are stored as text, REAL or NULL
+    dtypes = SCHEMAS[sheet]['dtypes']
+    for name in table.columns:
+        dtype = dtypes.get(name, 'str')
+        if dtype == 'date':
+            table[name] = pd.to_datetime(table[name])
+        elif dtype in ('int', 'float'):
+            table[name] = table[name].astype(_PANDAS_DTYPES[dtype])
+        else:
+            table[name] = table[name].fillna('').astype(_PANDAS_DTYPES[dtype])
+    return table
+
+
+def _member_rows(header, columns):
+    # Sheet row of each member_id, so updates need no lookup request. The
+    # first row wins if an ID was duplicated by hand, like a find() would.
+    if 'member_id' not in header:
+        return {}
+    member_ids = pd.to_numeric(pd.Series(columns[header.index('member_id')], dtype=object), errors='coerce')
+    rows = {}
+    for offset, member_id in enumerate(member_ids):
+        if pd.notna(member_id):
+            rows.setdefault(int(member_id), offset + 2)  # Row 1 is the header
+    return rows
+
+
+class _TableStore:
+    """The loaded tables, shared by every session of this server process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.transactions = _TransactionsSync()
+        self.members_df = None
+        self.members_header = None
+        self.member_rows = {}  # member_id -> sheet row number
+        self.version = None  # Data version the tables reflect
+        self.loaded_at = float('-inf')
+        self.synced_at = None  # Wall-clock time of the last successful load
+        self.error = None  # Why the last load from Google Sheets failed
+        self.retry_at = 0.0
+
+    def is_fresh(self, version):
+        if self.version != version:
+            return False
+        # With the replica, a background thread keeps the tables current
+        return REPLICA_ENABLED or time.monotonic() - self.loaded_at < CACHE_TTL_SECONDS
+
+    def ranges(self, full=False):
+        # Members and (the new part of) Transactions come back in one request
+        return ['Members'] + self.transactions.ranges(full=full or not INCREMENTAL_TRANSACTIONS)
+
+    def refresh(self, version, fetched=None):
+        """
+        Brings the tables up to date.
+
+        Args:
+            version (int): Data version the tables will reflect.
+            fetched (list): Values already fetched for ranges(). No request
+                is made then.
+
+        Returns:
+            bool: False when fetched holds a Transactions delta showing the
+            sheet was edited by hand: nothing is changed, and ranges(full=True)
+            has to be fetched instead. Without fetched, that is done here.
+        """
+        if fetched is None:
+            if not self.refresh(version, get_storage().fetch_columns(self.ranges())):
+                self.refresh(version, get_storage().fetch_columns(self.ranges(full=True)))
+            return True
+        members_columns, *transactions_ranges = fetched
+        if not self.transactions.apply(transactions_ranges):
+            return False
+        header, columns = _split_header(members_columns)
+        self.members_df = _table_frame('Members', header, columns)
+        self.members_header = header
+        self.member_rows = _member_rows(header, columns)
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.synced_at = time.time()
+        self.error = None
+        return True
+
+    def replica_tables(self):
+        """Returns the tables and sync state to save in the replica."""
+        tables = {
+            'members': (self.members_df, None),
+            'transactions': (self.transactions.transactions_df, self.transactions.generation)
+        }
+        state = {
+            'members_header': self.members_header,
+            'member_rows': list(self.member_rows.items()),
+            'transactions': self.transactions.state(),
+            'synced_at': self.synced_at
+        }
+        return tables, state
+
+    def restore(self, replica, version):
+        """
+        Loads the tables saved in a local copy, if any; they get synced next.
+
+        Args:
+            replica (SheetSnapshot or SheetReplica): Copy to load them from.
+            version (int): Data version the tables will reflect.
+
+        Returns:
+            bool: Whether the copy held tables.
+        """
+        saved = replica.load(['members', 'transactions'])
+        if saved is None:
+            return False
+        tables, state = saved
+        if isinstance(replica, SheetReplica):
+            tables = {name: _restore_dtypes(sheet, tables[name]) for name, sheet in (
+                ('members', 'Members'), ('transactions', 'Transactions')
+            )}
+        self.members_df = tables['members']
+        self.members_header = state['members_header']
+        self.member_rows = dict(state['member_rows'])
+        self.transactions.restore(state['transactions'], tables['transactions'])
+        self.synced_at = state['synced_at']
+        self.version = version
+        self.loaded_at = float('-inf')
+        return True
+
+
+@st.cache_resource(show_spinner=False)
+def _table_store():
+    return _TableStore()
+
+
+@st.cache_resource(show_spinner=False)
+def _local_copies():
+    # Every sync is saved to each of them. A restarted server loads the first
+    # one holding tables: the Parquet snapshot, then the SQLite replica.
+    copies = [SheetSnapshot(SNAPSHOT_PATH)] if SNAPSHOT_ENABLED else []
+    return copies + [SheetReplica(REPLICA_PATH)]
+
+
+def _sync_unlocked(store):
+    # Downloads without holding the lock, so pages are served the current
+    # tables meanwhile, including the whole of Transactions when a delta
+    # shows it was edited by hand. If the tables changed in between (a write
+    # or a reload), the download is dropped and None returned; otherwise the
+    # replica_tables() of the applied tables.
+    for full in (False, True):
+        with store.lock:
+            version, loaded_at = data_version(), store.loaded_at
+            ranges = store.ranges(full=full)
+        fetched = get_storage().fetch_columns(ranges)
+        with store.lock:
+            if data_version() != version or store.loaded_at != loaded_at:
+                return None
+            if store.refresh(version, fetched):
+                return store.replica_tables()
+
+
+def _sync_in_background(store, copies):
+    # Pulls changes from Google Sheets every SYNC_INTERVAL_SECONDS and saves
+    # them to the local copies, so page loads never wait on Sheets
+    while True:
+        now = time.monotonic()
+        if now - store.loaded_at >= SYNC_INTERVAL_SECONDS and now >= store.retry_at:
+            synced = None
+            try:
+                synced = _sync_unlocked(store)  # Redone on the next pass if dropped
+            except Exception as e:
+                store.error = str(e) or type(e).__name__
+                store.retry_at = time.monotonic() + OFFLINE_RETRY_SECONDS
+            if synced is not None:
+                for copy in copies:
+                    try:
+                        copy.save(*synced)
+                    except Exception:
+                        _LOGGER.exception("Could not save the local copy at %s", copy.path)
+        time.sleep(1)
+
+
+@st.cache_resource(show_spinner=False)
+def _background_sync():
+    thread = threading.Thread(
+        target=_sync_in_background, args=(_table_store(), _local_copies()), name="sheets-sync", daemon=True
+    )
+    thread.start()
+    return thread
+
+
+@traced()
+def get_member_data():
+    """
+    Returns the Members and Transactions tables, shared across sessions.
+
+    The tables live in memory, so reruns triggered by widgets (e.g. typing in
+    the search box) make no request. With the replica on, a restarted server
+    starts from the local Parquet snapshot (or the SQLite replica) and a
+    background thread pulls changes from Google Sheets; otherwise the sheets
+    are downloaded at most once per TTL window. Writes made through this app are visible at once either way.
+    If Google Sheets cannot be reached, the copy already loaded keeps being
+    served (see sync_status()). The frames are shared: callers must not
+    modify them.
+
+    Returns:
+        tuple: (members_df, transactions_df)
+    """
+    return _current_tables()
+
+
+def refresh_member_data(max_age_seconds):
+    """
+    Reloads the shared tables if they are older than max_age_seconds, e.g.
+    from a background thread so that no page load has to.
+
+    With the replica on, the background sync already keeps the tables
+    current without blocking pages, so this only makes sure they are loaded.
+    """
+    _current_tables(show_spinner=False, max_age=None if REPLICA_ENABLED else max_age_seconds)
+
+
+def _current_tables(show_spinner=True, strict=False, max_age=None):
+    # strict: raise instead of serving an out of date copy, for writes that
+    # check the tables (e.g. for duplicates) before sending anything
+    store = _table_store()
+    with store.lock:
+        version = data_version()
+        if REPLICA_ENABLED and store.members_df is None:
+            for copy in _local_copies():
+                if store.restore(copy, version):
+                    break
+        fresh = store.is_fresh(version) and (max_age is None or time.monotonic() - store.loaded_at < max_age)
+        if not fresh and (strict or time.monotonic() >= store.retry_at):
+            try:
+                with st.spinner("Loading member data...") if show_spinner else nullcontext():
+                    store.refresh(version)
+            except Exception as e:
+                if strict or store.members_df is None:
+                    raise
+                store.error = str(e) or type(e).__name__
+                store.retry_at = time.monotonic() + OFFLINE_RETRY_SECONDS
+        members_df, transactions_df = store.members_df, store.transactions.transactions_df
+    if REPLICA_ENABLED:
+        _background_sync()
+    return members_df, transactions_df
+
+
+def snapshot_key():
+    """
+    Identifies the tables currently served: it changes with every write
+    and every reload, so results derived from the tables can be cached on it.
+    """
+    store = _table_store()
+    return data_version(), store.synced_at
+
+
+def sync_status():
+    """
+    Tells how current the served tables are.
+
+    Returns:
+        dict: 'synced_at', the time.time() of the last successful load from
+        Google Sheets (None if never), and 'error', why the latest attempt
+        failed (None when it succeeded).
+    """
+    store = _table_store()
+    return {'synced_at': store.synced_at, 'error': store.error}
+
+
+def _ingest_appended_transactions(row_number, header, rows):
+    # Bump the version for every session. If the shared tables were current
+    # and the rows landed right after the ingested ones, apply them in memory
+    # so the next read needs no request at all.
+    store = _table_store()
+    with store.lock:
+        previous_version = data_version()
+        version = invalidate()
+        if store.version != previous_version or row_number is None:
+            return
+        if store.transactions.append_local(row_number, header, rows):
+            store.version = version
+
+
+@st.cache_resource(show_spinner=False)
+def _transactions_header():
+    # Rows are written in the sheet's own column order. Schema columns the
+    # sheet does not have yet (e.g. duration_days) are added to its header
+    # once per process.
+    storage = get_storage()
+    header = _trim(storage.header('Transactions'))
+    missing = [name for name in SCHEMAS['Transactions']['dtypes'] if name not in header]
+    if missing:
+        storage.add_columns('Transactions', len(header) + 1, missing)
+        header = header + missing
+    return header
+
+
+def _transaction_row(values):
+    # Ensure all values are strings to prevent misinterpretation
+    header = _transactions_header()
+    return header, [str(values.get(name, '')) for name in header]
+
+
+@traced()
+def add_transactions(transactions):
+    """
+    Appends many transactions with a single request.
+
+    Transactions whose transaction_id is already in the sheet, or earlier in
+    the same batch, are skipped, so submitting the same batch twice does not
+    record anything twice.
+
+    Args:
+        transactions (list): Dicts of transaction values by column name:
+            transaction_id (e.g. '20241001-12'), member_id,
+            membership_types_id, transaction_type ('signup' or 'renewal'),
+            amount, payment_method ('cash' or 'e-money'), transaction_date
+            (membership start, 'YYYY-MM-DD'), note and duration_days.
+
+    Returns:
+        list: 'added' or 'duplicate' for each transaction, in input order.
+    """
+    _, transactions_df = _current_tables(show_spinner=False, strict=True)
+    recorded = set(transactions_df['transaction_id'])
+    statuses = []
+    rows = []
+    for transaction in transactions:
+        transaction_id = str(transaction['transaction_id'])
+        if transaction_id in recorded:
+            statuses.append('duplicate')
+            continue
+        recorded.add(transaction_id)
+        header, row = _transaction_row(transaction)
+        rows.append(row)
+        statuses.append('added')
+
+    if rows:
+        row_number = get_storage().append_rows('Transactions', rows)
+        _ingest_appended_transactions(row_number, header, rows)
+    return statuses
+
+
+def _member_changes(store, member_id, updated_data):
+    # Fields of updated_data whose value differs from the shared table
+    if int(member_id) not in store.member_rows:
+        raise LookupError(f"Member ID {member_id} not found in the sheet.")
+    unknown = [name for name in updated_data if name not in store.members_header]
+    if unknown:
+        raise ValueError(f"Worksheet 'Members' has no columns: {', '.join(unknown)}")
+    members_df = store.members_df
+    current = members_df.loc[members_df['member_id'] == int(member_id)].iloc[0]
+    return {
+        name: value for name, value in updated_data.items()
+        if name not in current or str(current[name]) != str(value)
+    }
+
+
+def _moved_member_rows(header, rows):
+    # The row numbers are those of the last load, and the sheet may have been
+    # sorted or edited by hand since: read back the member_id cell of every
+    # row about to be written, all in one request
+    if not rows:
+        return []
+    column = rowcol_to_a1(1, header.index('member_id') + 1).rstrip('1')
+    cells = get_storage().fetch_columns([f"Members!{column}{row}" for row in rows.values()])
+    moved = []
+    for member_id, columns in zip(rows, cells):
+        value = pd.to_numeric(columns[0][0] if columns and columns[0] else '', errors='coerce')
+        if value != member_id:
+            moved.append(member_id)
+    return moved
+
+
+@traced()
+def update_members(updates):
+    """
+    Writes the changed fields of several members' rows with one request.
+
+    Rows are looked up in the shared tables instead of searching the sheet,
+    and fields whose value is unchanged are not sent at all. The member_id
+    of each row is read back first (one small request); if a row no longer
+    holds its member, the tables are reloaded and the rows looked up again.
+    Requests are made without holding the store lock, so pages are not held
+    up by a queued edit.
+
+    Args:
+        updates (dict): New values by column name, per member_id.
+
+    Returns:
+        dict: Names of the fields written, per member_id (as int).
+
+    Raises:
+        LookupError: If a member_id is not in the Members sheet.
+        ValueError: If a field is not a column of the Members sheet.
+        TimeoutError: If the tables kept changing while being reloaded;
+            worth retrying.
+    """
+    store = _table_store()
+    found_moved = False
+    for _ in range(3):
+        # Look the rows up in the current tables, reloaded (without the lock)
+        # when out of date or when a row was found to hold another member
+        with store.lock:
+            current = store.members_df is not None and store.is_fresh(data_version())
+            if current:
+                changes = {
+                    int(member_id): _member_changes(store, member_id, updated_data)
+                    for member_id, updated_data in updates.items()
+                }
+                rows = {member_id: store.member_rows[member_id] for member_id, changed in changes.items() if changed}
+                header = store.members_header
+        if current:
+            moved = _moved_member_rows(header, rows)
+            if not moved:
+                break
+            if found_moved:
+                raise LookupError(f"Member ID {moved[0]} not found in the sheet.")
+            found_moved = True
+        _sync_unlocked(store)
+    else:
+        raise TimeoutError("The member data kept changing while it was reloaded.")
+
+    cells = [
+        (rows[member_id], header.index(name) + 1, value)
+        for member_id, member_changes in changes.items()
+        for name, value in member_changes.items()
+    ]
+    if not cells:
+        return {member_id: [] for member_id in changes}
+
+    get_storage().update_cells('Members', cells)  # Parsed like typing them in, as update_cell did
+
+    # Apply the edits to the shared table too when it was current, so the
+    # next read needs no request
+    with store.lock:
+        previous_version = data_version()
+        version = invalidate()
+        changed_fields = {name for member_changes in changes.values() for name in member_changes}
+        text_fields = all(SCHEMAS['Members']['dtypes'].get(name, 'str') == 'str' for name in changed_fields)
+        if store.version == previous_version and text_fields:
+            members_df = store.members_df.copy(deep=False)  # Only the changed columns get copied
+            for member_id, member_changes in changes.items():
+                if member_changes:
+                    members_df.loc[members_df['member_id'] == member_id, list(member_changes)] = [
+                        str(value) for value in member_changes.values()
+                    ]
+            store.members_df = members_df
+            store.version = version
+        return {member_id: list(member_changes) for member_id, member_changes in changes.items()}
+
+
+@traced()
+def add_member(member_row, transaction):
+    """
+    Appends a new member and their first transaction in one request.
+
+    Both rows go out in a single spreadsheets.batchUpdate, which Google
+    applies atomically: either both rows are added or neither is.
+
+    Args:
+        member_row (list): Members row, in sheet column order.
+        transaction (dict): Transaction values by column name, as taken by
+            add_transactions().
+    """
+    _, transaction_row = _transaction_row(transaction)
+    try:
+        get_storage().append_rows_atomically({'Members': [member_row], 'Transactions': [transaction_row]})
+    finally:
+        invalidate()  # Even a failed request may have been applied
+
+
+class _MemberIdAllocator:
+    """
+    Hands out member IDs from a counter cell in the Counters worksheet.
+
+    The last value seen is cached, and each ID is reserved with one
+    conditional replace of exactly that value by the next one. If another
+    process moved the counter first nothing is replaced, so the counter is
+    re-read and the reservation retried. Two desks can never get the same ID
+    and IDs of deleted rows are never handed out again.
+    """
+
+    MAX_ATTEMPTS = 5
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.last_id = None
+
+    def _open(self):
+        try:
+            self.last_id = self._read()
+        except WorksheetNotFound:
+            # First run: start counting from the highest ID in use
+            members_df, _ = get_member_data()
+            last_id = int(members_df['member_id'].max()) if len(members_df) else 0
+            try:
+                get_storage().create_sheet(COUNTERS_SHEET, [['last_member_id', last_id]])
+            except WorksheetExists:
+                pass  # Another process created it first: use its counter
+            self.last_id = self._read()
+
+    def _read(self):
+        return int(get_storage().read_cell(COUNTERS_SHEET, 1, 2) or 0)
+
+    def _reserve(self, expected, new):
+        # Conditional write: only replaces the counter (B1) if it still holds expected
+        return get_storage().replace_cell(COUNTERS_SHEET, 1, 2, expected, new)
+
+    def allocate(self):
+        with self.lock:
+            if self.last_id is None:
+                self._open()
+            # Also skip past IDs of rows added to Members by hand
+            store = _table_store()
+            with store.lock:
+                highest_loaded = max(store.member_rows, default=0)
+            for _ in range(self.MAX_ATTEMPTS):
+                new_id = max(self.last_id, highest_loaded) + 1
+                if self._reserve(self.last_id, new_id):
+                    self.last_id = new_id
+                    return new_id
+                self.last_id = self._read()
+            raise RuntimeError("Could not reserve a member ID, please try again.")
+
+
+@st.cache_resource(show_spinner=False)
+def _member_id_allocator():
+    return _MemberIdAllocator()
+
+
+def allocate_member_id():
+    """
+    Reserves a new, never used member ID.
+
+    Usually costs a single small write request, whatever the roster size.
+
+    Returns:
+        int: The reserved member_id.
+    """
+    return _member_id_allocator().allocate()
+
+
+# Writes are journaled on local disk first and sent to Google Sheets by a
+# background flusher, so a quota error or a network blip delays a write
+# instead of losing it. Handlers are called again after a failure, so each
+# one checks what already reached the sheet.
+
+def _is_retryable(error):
+    if isinstance(error, APIError):
+        return error.code == 429 or error.code >= 500  # Quota or server trouble
+    return isinstance(error, (OSError, TransportError))  # Network errors and timeouts
+
+
+def _flush_transactions(payloads):
+    try:
+        add_transactions(payloads)  # Skips transaction_ids already recorded
+    except Exception:
+        invalidate()  # The rows may have landed: re-read before retrying
+        raise
+
+
+def _flush_member_updates(payloads):
+    # Later edits of the same member win, and all go out in one request
+    updates = {}
+    for payload in payloads:
+        updates.setdefault(payload['member_id'], {}).update(payload['changes'])
+    update_members(updates)
+
+
+def _flush_members(payloads):
+    _current_tables(show_spinner=False, strict=True)
+    store = _table_store()
+    for payload in payloads:
+        if payload['member_row'][0] in store.member_rows:
+            continue  # Written by an earlier attempt
+        add_member(payload['member_row'], payload['transaction'])
+        _current_tables(show_spinner=False, strict=True)
+
+
+def _discard_member(payload):
+    # The registration was rejected for good, so its photo is orphaned
+    if payload.get('photo'):
+        delete_photo(payload['photo'])
+
+
+def _traced_flush(kind, handler):
+    # Writes reach Google Sheets after the rerun that queued them ended, so
+    # every flush is traced on its own
+    def flush(payloads):
+        with background_trace(f"sync {kind}"):
+            handler(payloads)
+    return flush
+
+
+@st.cache_resource(show_spinner=False)
+def _journal():
+    handlers = {
+        'member': _flush_members,
+        'member_update': _flush_member_updates,
+        'transaction': _flush_transactions
+    }
+    return WriteJournal(
+        JOURNAL_PATH,
+        {kind: _traced_flush(kind, handler) for kind, handler in handlers.items()},
+        _is_retryable,
+        on_failed={'member': _discard_member}
+    )
+
+
+def queue_transactions(transactions):
+    """
+    Journals transactions to append; see add_transactions() for the values.
+
+    Returns:
+        list: For each transaction, its journal entry id, or None when its
+        transaction_id is already recorded or queued.
+    """
+    _, transactions_df = get_member_data()
+    recorded = set(transactions_df['transaction_id'])
+    payloads = [
+        {name: str(value) if name == 'transaction_id' else value for name, value in transaction.items()}
+        for transaction in transactions
+    ]
+    ids = _journal().add(
+        'transaction',
+        [payload for payload in payloads if payload['transaction_id'] not in recorded],
+        keys=[payload['transaction_id'] for payload in payloads if payload['transaction_id'] not in recorded]
+    )
+    queued = iter(ids)
+    return [None if payload['transaction_id'] in recorded else next(queued) for payload in payloads]
+
+
+def queue_member_update(member_id, updated_data):
+    """
+    Journals the fields of a member that differ from the shared table.
+
+    Returns:
+        tuple: (journal entry ids, names of the changed fields); both empty
+        when nothing changed.
+
+    Raises:
+        LookupError: If member_id is not in the Members sheet.
+        ValueError: If a field is not a column of the Members sheet.
+    """
+    get_member_data()
+    store = _table_store()
+    with store.lock:
+        changes = _member_changes(store, member_id, updated_data)
+    if not changes:
+        return [], []
+    return _journal().add('member_update', [{'member_id': int(member_id), 'changes': changes}]), list(changes)
+
+
+def queue_member(member_row, transaction, photo=None):
+    """
+    Journals a new member and their first transaction; see add_member().
+
+    Args:
+        photo (dict): upload_photo() result of the member's photo, deleted
+            if the registration fails for good.
+
+    Returns:
+        list: The journal entry id.
+    """
+    payload = {'member_row': member_row, 'transaction': transaction}
+    if photo:
+        payload['photo'] = {'public_id': photo['public_id']}
+    return _journal().add('member', [payload], keys=[f"member:{member_row[0]}"])
+
+
+def pending_writes():
+    """
+    Returns:
+        dict: 'pending' and 'failed' journal entry counts, 'error', the
+        last error sending them, and 'failed_error', why the latest failed
+        one was rejected.
+    """
+    return _journal().status()
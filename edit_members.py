@@ -1,13 +1,11 @@
 import streamlit as st
-from google.oauth2 import service_account
-import gspread
-import pandas as pd
 from datetime import datetime
 import cloudinary
-import cloudinary.uploader
-import tempfile
-import os
-from PIL import Image
+from data import get_member_data, queue_member_update
+from images import cloudinary_thumbnail_url, describe_savings, upload_photo
+from membership import genders, workout_times
+from search import get_search_index
+from tracing import traced
 
 def app():
     # Initialize Cloudinary
@@ -17,35 +15,6 @@ def app():
         api_secret=st.secrets['cloudinary']['api_secret']
     )
 
-    # Function to initialize Google Sheets connection
-    def init_connection():
-        scope = [
-            "https://spreadsheets.google.com/feeds",
-            'https://www.googleapis.com/auth/spreadsheets',
-            "https://www.googleapis.com/auth/drive.file",
-            "https://www.googleapis.com/auth/drive"
-        ]
-        creds = service_account.Credentials.from_service_account_info(
-                    st.secrets["gcp_service_account"],
-                    scopes=scope
-                )
-        client = gspread.authorize(creds)
-
-        # Access the Members Sheet
-        spreadsheet_id = st.secrets["google_sheets"]["spreadsheet_id"]
-        members_sheet = client.open_by_key(spreadsheet_id).worksheet('Members')
-
-        return client, members_sheet
-
-    # Function to fetch member data
-    @st.cache_data
-    def get_member_data(_client):
-        spreadsheet_id = st.secrets["google_sheets"]["spreadsheet_id"]
-        members_sheet = client.open_by_key(spreadsheet_id).worksheet('Members')
-        members_data = members_sheet.get_all_records()
-        members_df = pd.DataFrame(members_data)
-        return members_df
-
     # Function to format phone numbers
     def format_phone_number(phone_number):
         phone_number = phone_number.strip()  # Remove any leading/trailing spaces
@@ -61,56 +30,28 @@ def app():
 
     # Function to upload image to Cloudinary
     def upload_image_to_cloudinary(file):
-        temp_file_path = None
-
         try:
-            # Open the uploaded image file using Pillow
-            image = Image.open(file)
-
-            # Save the image to a temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as temp_file:
-                image.save(temp_file, format='JPEG')
-                temp_file_path = temp_file.name  # Get the path of the temporary file
-
-            # Upload the file to Cloudinary
-            upload_result = cloudinary.uploader.upload(temp_file_path, folder="gym_members")
+            # Upright, downsized and compressed in memory, then uploaded
+            upload_result, photo_stats = upload_photo(file)
             if 'url' in upload_result:
-                return upload_result['url'], temp_file_path, 0  # Success
+                st.caption(describe_savings(photo_stats))
+                return upload_result['url'], 0  # Success
             else:
-                return None, None, 1  # Error: No URL found in response
+                return None, 1  # Error: No URL found in response
 
         except Exception as e:
             st.error(f"Error during image upload: {e}")
-            return None, None, 2  # Error during image upload
-
-        finally:
-            # Clean up the temporary file
-            if temp_file_path and os.path.exists(temp_file_path):
-                try:
-                    os.remove(temp_file_path)
-                except Exception as cleanup_error:
-                    st.error(f"Error cleaning up temporary file: {cleanup_error}")
-
-    # Function to update member information
-    def update_member_info(client, member_id, updated_data):
-        spreadsheet_id = st.secrets["google_sheets"]["spreadsheet_id"]
-        members_sheet = client.open_by_key(spreadsheet_id).worksheet('Members')
-
-        # Find the row number where the member_id is located
-        cell = members_sheet.find(str(member_id))
-        if cell:
-            row_number = cell.row
-            headers = members_sheet.row_values(1)
-
-            # Update each field specified in updated_data
-            for key, value in updated_data.items():
-                if key in headers:
-                    col_index = headers.index(key) + 1  # Google Sheets columns start at 1
-                    members_sheet.update_cell(row_number, col_index, value)
-                else:
-                    st.warning(f"Field '{key}' not found in the sheet headers.")
-        else:
-            st.error(f"Member ID {member_id} not found in the sheet.")
+            return None, 2  # Error during image upload
+
+    # Function to update member information; returns the journal entry ids
+    # and the changed fields, or None on error
+    @traced()
+    def update_member_info(member_id, updated_data):
+        try:
+            return queue_member_update(member_id, updated_data)
+        except (LookupError, ValueError) as e:
+            st.error(str(e))
+            return None
 
     # Function to add background image
     def add_bg_from_url():
@@ -133,27 +74,35 @@ def app():
     add_bg_from_url()
     st.title('Edit Member Information')
 
-    # Initialize Google Sheets connection
-    client, members_sheet = init_connection()
-    members_df = get_member_data(client)
+    members_df, _ = get_member_data()
+
+    # Narrow the members to pick from, best match first
+    search_query = st.text_input('Search by name or phone number:')
+    if search_query:
+        ranked_ids = get_search_index().search(search_query)
+        if not ranked_ids:
+            st.warning("No member matches your search.")
+            return
+        candidates_df = members_df.set_index('member_id', drop=False).loc[ranked_ids]
+    else:
+        candidates_df = members_df
 
-    # Create a selection box for members
-    members_df['display_name'] = members_df['nick_name'] + ' (' + members_df['full_name'] + ')'
-    member_selection = st.selectbox('Select a member to edit:', members_df['display_name'])
+    # Create a selection box for members (the shared table itself is read-only)
+    display_names = candidates_df['nick_name'] + ' (' + candidates_df['full_name'] + ')'
+    member_selection = st.selectbox('Select a member to edit:', display_names)
 
     # Get the selected member's data
-    selected_member = members_df[members_df['display_name'] == member_selection].iloc[0]
+    selected_member = candidates_df[display_names == member_selection].iloc[0]
     member_id = selected_member['member_id']
 
     # Pre-fill the form with the selected member's data
     with st.form(f"edit_form_{member_id}"):
         nick_name = st.text_input("Nickname", value=selected_member['nick_name'])
         full_name = st.text_input("Full Name", value=selected_member['full_name'])
-        gender_options = ["Male", "Female", "Other"]
         gender = st.selectbox(
             "Gender",
-            gender_options,
-            index=gender_options.index(selected_member.get('gender', 'Male'))
+            genders,
+            index=genders.index(selected_member.get('gender', 'Male'))
         )
 
         # Handle birth date
@@ -168,7 +117,6 @@ def app():
         medical_info = st.text_area("Medical Information", value=selected_member.get('medical_info', ''))
         fitness_goal = st.text_input("Fitness Goal", value=selected_member.get('fitness_goal', ''))
 
-        workout_times = ["8am-10am", "11am-12pm", "1pm-3pm", "4pm-6pm", "6pm-7pm", "7pm-8pm", "8pm-9pm", "9pm-10pm"]
         preferred_workout_time = st.selectbox(
             "Preferred Workout Time",
             workout_times,
@@ -177,7 +125,7 @@ def app():
 
         # Display current photo
         st.write("Current Photo:")
-        st.image(selected_member.get('photo_url', ''), width=200)
+        st.image(cloudinary_thumbnail_url(selected_member.get('photo_url', '')), width=200)
 
         # File uploader for new photo
         new_photo = st.file_uploader("Upload New Photo", type=["jpg", "jpeg", "png"])
@@ -200,7 +148,7 @@ def app():
             # Handle photo upload
             if new_photo is not None:
                 with st.spinner("Uploading new photo..."):
-                    photo_url, temp_file_path, upload_status = upload_image_to_cloudinary(new_photo)
+                    photo_url, upload_status = upload_image_to_cloudinary(new_photo)
                     if upload_status == 0:
                         updated_data['photo_url'] = photo_url
                     else:
@@ -211,11 +159,11 @@ def app():
 
             # Update member information in Google Sheets
             with st.spinner("Updating member information..."):
-                update_member_info(client, member_id, updated_data)
-                st.success("Member information updated!")
-
-                # Clear cached data to refresh member data
-                get_member_data.clear()
-
-                # Optionally, rerun the app to reflect changes
-                st.rerun()
+                queued = update_member_info(member_id, updated_data)
+                if queued is None:
+                    st.stop()
+                _, updated_fields = queued
+            if not updated_fields:
+                st.info("Nothing to update, no field was changed.")
+            else:
+                st.success("Member information saved! It will reach Google Sheets shortly.")
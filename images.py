@@ -0,0 +1,251 @@
+import hashlib
+import io
+import os
+import re
+import threading
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import streamlit as st
+from config import get_setting
+from tracing import count_api_call, span
+
+# Pillow and the Cloudinary uploader are imported by the functions using
+# them: the member list only builds thumbnail URLs and should not load them
+
+# Largest photo kept, as (width, height). The member list shows photos at
+# 200x266, so this leaves room for high-density screens.
+MAX_PHOTO_SIZE = (
+    get_setting("photos", "max_width", 600),
+    get_setting("photos", "max_height", 800)
+)
+JPEG_QUALITY = get_setting("photos", "jpeg_quality", 82)
+
+# Size photos are shown at in the member list
+THUMBNAIL_SIZE = (200, 266)
+
+# Optional local copy of the thumbnails, served by Streamlit's static file
+# serving (server.enableStaticServing) instead of the CDN
+THUMBNAIL_CACHE = get_setting("photos", "thumbnail_cache", False)
+THUMBNAIL_CACHE_MB = get_setting("photos", "thumbnail_cache_mb", 200)
+_THUMBNAIL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'thumbnails')
+
+# Delivery URL of an uploaded original, e.g.
+# https://res.cloudinary.com/<cloud>/image/upload/v1234/gym_members/abc.jpg
+_CLOUDINARY_UPLOAD_URL = re.compile(r'^(https?://res\.cloudinary\.com/[^/]+/image/upload)/(.+)$')
+
+# EXIF orientations that rotate the picture by 90 or 270 degrees
+_ROTATED_ORIENTATIONS = (5, 6, 7, 8)
+_EXIF_ORIENTATION = 0x0112
+
+
+def _flatten(image):
+    from PIL import Image
+
+    # JPEG has no alpha channel: put transparent images on a white background
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    if image.mode != 'RGB':
+        return image.convert('RGB')
+    return image
+
+
+def prepare_photo(file, output, max_size=None):
+    """
+    Shrinks a member photo and encodes it as a compact progressive JPEG.
+
+    The photo is turned upright according to its EXIF orientation, flattened
+    to RGB and downsized to fit max_size. JPEGs are decoded directly at a
+    reduced scale when possible, which is much faster than decoding the full
+    camera resolution. EXIF metadata (e.g. location) is not kept.
+
+    Args:
+        file: Binary file-like object holding the photo, e.g. a Streamlit upload.
+        output: Binary file-like object the JPEG is written to.
+        max_size (tuple): Bounding box (width, height), defaults to MAX_PHOTO_SIZE.
+
+    Returns:
+        dict: 'original_bytes', 'prepared_bytes', 'saved_bytes' and the
+        final 'size' (width, height).
+    """
+    from PIL import Image, ImageOps
+
+    max_size = max_size or MAX_PHOTO_SIZE
+    file.seek(0, os.SEEK_END)
+    original_bytes = file.tell()
+    file.seek(0)
+
+    image = Image.open(file)
+    if image.format == 'JPEG':
+        # draft() works on the stored (not yet rotated) image
+        box = max_size
+        if image.getexif().get(_EXIF_ORIENTATION) in _ROTATED_ORIENTATIONS:
+            box = (max_size[1], max_size[0])
+        image.draft('RGB', box)
+
+    image = _flatten(ImageOps.exif_transpose(image))
+    image.thumbnail(max_size, Image.Resampling.LANCZOS)
+
+    start = output.tell()
+    image.save(output, format='JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    prepared_bytes = output.tell() - start
+    return {
+        'original_bytes': original_bytes,
+        'prepared_bytes': prepared_bytes,
+        'saved_bytes': original_bytes - prepared_bytes,
+        'size': image.size
+    }
+
+
+def upload_photo(file, folder="gym_members"):
+    """
+    Prepares a member photo in memory and uploads it to Cloudinary.
+
+    The JPEG is encoded into a memory buffer that the uploader reads through
+    a view, so nothing touches the disk and the bytes are not copied again.
+
+    Args:
+        file: Binary file-like object holding the photo, e.g. a Streamlit upload.
+        folder (str): Cloudinary folder to upload into.
+
+    Returns:
+        tuple: (Cloudinary upload result, prepare_photo() statistics)
+    """
+    import cloudinary.uploader
+
+    buffer = io.BytesIO()
+    with span("prepare_photo"):
+        stats = prepare_photo(file, buffer)
+    with span("cloudinary_upload"), buffer.getbuffer() as data:
+        upload_result = cloudinary.uploader.upload(('photo.jpg', data), folder=folder)
+    count_api_call('cloudinary', sent=stats['prepared_bytes'])
+    return upload_result, stats
+
+
+def delete_photo(upload_result):
+    """Removes a photo uploaded by upload_photo(), e.g. when registration fails afterwards."""
+    import cloudinary.uploader
+
+    cloudinary.uploader.destroy(upload_result['public_id'])
+
+
+def describe_savings(stats):
+    """Returns a one-line summary of prepare_photo() statistics for the UI."""
+    original_kb = stats['original_bytes'] / 1024
+    prepared_kb = stats['prepared_bytes'] / 1024
+    width, height = stats['size']
+    if stats['saved_bytes'] <= 0:
+        return f"Photo resized to {width}x{height} ({prepared_kb:.0f} KB)."
+    return (
+        f"Photo resized to {width}x{height}: {original_kb:.0f} KB -> {prepared_kb:.0f} KB "
+        f"({stats['saved_bytes'] / stats['original_bytes']:.0%} smaller)."
+    )
+
+
+def cloudinary_thumbnail_url(photo_url, size=THUMBNAIL_SIZE, image_format='auto'):
+    """
+    Returns the URL of a thumbnail Cloudinary renders from a photo.
+
+    Cloudinary crops and scales the photo on the first request and serves it
+    from its CDN afterwards. With image_format 'auto' browsers get WebP or
+    AVIF when they support it. Photos not hosted on Cloudinary are returned
+    unchanged.
+
+    Args:
+        photo_url (str): Delivery URL of the original photo.
+        size (tuple): Thumbnail (width, height).
+        image_format (str): 'auto', or a fixed format such as 'webp'.
+
+    Returns:
+        str: Thumbnail URL.
+    """
+    match = _CLOUDINARY_UPLOAD_URL.match(str(photo_url))
+    if not match:
+        return photo_url
+    width, height = size
+    return f"{match.group(1)}/c_fill,g_face,w_{width},h_{height},f_{image_format},q_auto/{match.group(2)}"
+
+
+class _ThumbnailCache:
+    """
+    Thumbnails kept on local disk, least recently used evicted first.
+
+    A thumbnail missing from the cache is downloaded in the background while
+    the page keeps using the CDN URL, so rendering never waits on it.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.pending = set()
+        self.pool = ThreadPoolExecutor(max_workers=4)
+
+        # File name -> size, least recently used first; files left by a
+        # previous run start out in the order they were written
+        os.makedirs(directory, exist_ok=True)
+        entries = [entry for entry in os.scandir(directory) if entry.name.endswith('.webp')]
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        self.files = OrderedDict((entry.name, entry.stat().st_size) for entry in entries)
+        self.total_bytes = sum(self.files.values())
+
+    def url(self, source_url):
+        name = hashlib.sha1(source_url.encode('utf-8')).hexdigest() + '.webp'
+        with self.lock:
+            if name in self.files:
+                self.files.move_to_end(name)
+                return f"app/static/thumbnails/{name}"
+            if name not in self.pending:
+                self.pending.add(name)
+                self.pool.submit(self._download, source_url, name)
+        return source_url
+
+    def _download(self, source_url, name):
+        try:
+            with urllib.request.urlopen(source_url, timeout=10) as response:
+                data = response.read()
+            # Write under another name first so a half-written file is never served
+            path = os.path.join(self.directory, name)
+            with open(path + '.part', 'wb') as file:
+                file.write(data)
+            os.replace(path + '.part', path)
+            with self.lock:
+                self.files[name] = len(data)
+                self.total_bytes += len(data)
+                self._evict()
+        except Exception:
+            pass  # The CDN URL keeps being used
+        finally:
+            with self.lock:
+                self.pending.discard(name)
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self.files) > 1:
+            name, size = self.files.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+
+@st.cache_resource(show_spinner=False)
+def _thumbnail_cache():
+    return _ThumbnailCache(_THUMBNAIL_DIR, THUMBNAIL_CACHE_MB * 1024 * 1024)
+
+
+def thumbnail_url(photo_url, size=THUMBNAIL_SIZE):
+    """
+    Returns the URL an <img> tag should use for a member photo thumbnail.
+
+    This is the Cloudinary thumbnail URL, or the path of a local copy when
+    the [photos] thumbnail_cache setting is on and the copy is ready.
+    """
+    url = cloudinary_thumbnail_url(photo_url, size)
+    if not THUMBNAIL_CACHE or url == photo_url:
+        return url
+    # The cached file needs a fixed format rather than one picked per browser
+    return _thumbnail_cache().url(cloudinary_thumbnail_url(photo_url, size, image_format='webp'))
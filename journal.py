@@ -0,0 +1,189 @@
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from config import get_setting
+
+# Local journal of writes waiting to reach Google Sheets
+JOURNAL_PATH = get_setting(
+    "journal", "path",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'journal.sqlite3')
+)
+# Retry delays grow from RETRY_BASE_SECONDS up to RETRY_MAX_SECONDS
+RETRY_BASE_SECONDS = get_setting("journal", "retry_base_seconds", 2.0)
+RETRY_MAX_SECONDS = get_setting("journal", "retry_max_seconds", 300.0)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def backoff_seconds(attempts):
+    """Exponential backoff with jitter, so retries from many writes spread out."""
+    delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    return random.uniform(delay / 2, delay)
+
+
+class WriteJournal:
+    """
+    Durable queue of writes, flushed to Google Sheets by a background thread.
+
+    Each entry has a kind and a JSON payload, and optionally a key: an entry
+    whose key is already queued is not added again. The flusher hands every
+    due entry of a kind to that kind's handler in one call, so queued rows go
+    out in batches. When a handler fails with an error is_retryable() accepts,
+    its entries are retried later with exponential backoff. Otherwise a batch
+    is applied again entry by entry, and the entries that still fail are kept
+    as failed, for someone to look at; their keys are freed so the same write
+    can be queued again.
+    """
+
+    def __init__(self, path, handlers, is_retryable, on_failed=None):
+        """
+        Args:
+            path (str): SQLite file holding the journal.
+            handlers (dict): Kind -> function applying a list of payloads.
+                It is called again after a failure, so it must be idempotent.
+            is_retryable (callable): Tells whether an exception is worth retrying.
+            on_failed (dict): Kind -> function called with the payload of each
+                entry kept as failed, e.g. to undo what was done before it
+                was queued.
+        """
+        self.path = path
+        self.handlers = handlers
+        self.is_retryable = is_retryable
+        self.on_failed = on_failed or {}
+        self.lock = threading.Lock()
+        self.wake = threading.Event()  # Set when entries are added
+        self.last_error = None
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " kind TEXT NOT NULL,"
+                " key TEXT UNIQUE,"
+                " payload TEXT NOT NULL,"
+                " status TEXT NOT NULL DEFAULT 'pending',"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " next_attempt_at REAL NOT NULL DEFAULT 0,"
+                " error TEXT)"
+            )
+        self.thread = threading.Thread(target=self._flush_forever, name="journal-flush", daemon=True)
+        self.thread.start()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def add(self, kind, payloads, keys=None):
+        """
+        Journals writes; they are flushed in the background.
+
+        Args:
+            kind (str): Handler to apply them with.
+            payloads (list): JSON-serializable payloads.
+            keys (list): Optional idempotency key per payload (None for none).
+
+        Returns:
+            list: Entry id of each payload, or None where its key was already
+            queued.
+        """
+        keys = keys or [None] * len(payloads)
+        ids = []
+        with self.lock, closing(self._connect()) as connection, connection:
+            for payload, key in zip(payloads, keys):
+                cursor = connection.execute(
+                    "INSERT OR IGNORE INTO entries (kind, key, payload) VALUES (?, ?, ?)",
+                    (kind, key, json.dumps(payload))
+                )
+                ids.append(cursor.lastrowid if cursor.rowcount else None)
+        self.wake.set()
+        return ids
+
+    def status(self):
+        """
+        Returns:
+            dict: 'pending' and 'failed' entry counts, 'error', the last
+            flush error (None after a successful flush), and 'failed_error',
+            the error of the latest failed entry.
+        """
+        with self.lock, closing(self._connect()) as connection:
+            counts = dict(connection.execute("SELECT status, COUNT(*) FROM entries GROUP BY status").fetchall())
+            failed_error = connection.execute(
+                "SELECT error FROM entries WHERE status = 'failed' ORDER BY id DESC LIMIT 1"
+            ).fetchone()
+        return {
+            'pending': counts.get('pending', 0),
+            'failed': counts.get('failed', 0),
+            'error': self.last_error,
+            'failed_error': failed_error[0] if failed_error else None
+        }
+
+    def _due(self):
+        with self.lock, closing(self._connect()) as connection:
+            return connection.execute(
+                "SELECT id, kind, payload, attempts FROM entries"
+                " WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY id",
+                (time.time(),)
+            ).fetchall()
+
+    def flush(self):
+        """Applies every due entry, one handler call per kind."""
+        batches = {}
+        for entry_id, kind, payload, attempts in self._due():
+            batches.setdefault(kind, []).append((entry_id, json.loads(payload), attempts))
+
+        for kind, entries in batches.items():
+            self._apply(kind, entries)
+
+    def _apply(self, kind, entries):
+        try:
+            self.handlers[kind]([entry[1] for entry in entries])
+        except Exception as e:
+            if len(entries) > 1 and not self.is_retryable(e):
+                # One bad payload fails its whole batch: apply the entries one
+                # by one, so only the bad ones are kept as failed
+                for entry in entries:
+                    self._apply(kind, [entry])
+                return
+            self.last_error = str(e) or type(e).__name__
+            self._failed(kind, entries, e)
+        else:
+            self.last_error = None
+            with self.lock, closing(self._connect()) as connection, connection:
+                connection.executemany("DELETE FROM entries WHERE id = ?", [(entry[0],) for entry in entries])
+
+    def _failed(self, kind, entries, error):
+        retry = self.is_retryable(error)
+        now = time.time()
+        with self.lock, closing(self._connect()) as connection, connection:
+            for entry_id, _, attempts in entries:
+                # A failed entry no longer holds its key, so the write can be queued again
+                connection.execute(
+                    "UPDATE entries SET status = ?, attempts = ?, next_attempt_at = ?, error = ?,"
+                    " key = CASE WHEN ? THEN key END WHERE id = ?",
+                    (
+                        'pending' if retry else 'failed',
+                        attempts + 1,
+                        now + backoff_seconds(attempts + 1),
+                        str(error) or type(error).__name__,
+                        retry,
+                        entry_id
+                    )
+                )
+        if not retry and kind in self.on_failed:
+            for _, payload, _ in entries:
+                try:
+                    self.on_failed[kind](payload)
+                except Exception:
+                    _LOGGER.exception("Could not clean up after a failed %s write", kind)
+
+    def _flush_forever(self):
+        while True:
+            self.wake.wait(1)
+            self.wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                _LOGGER.exception("Could not flush the write journal")
@@ -1,10 +1,52 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
-import gspread
-from google.oauth2 import service_account
-from datetime import datetime, timedelta
+from datetime import datetime
 import urllib.parse
+import html
+import math
 import cloudinary
+from config import get_setting
+from data import get_member_data, queue_transactions
+from images import thumbnail_url
+from membership import get_processed_member_data, payment_types
+from search import get_search_index
+from storage import get_storage
+from tracing import span
+
+DEFAULT_PAGE_SIZE = get_setting("member_list", "page_size", 20)
+
+TAG_COLORS = {"Red": "#FF4B4B", "Yellow": "#FFBD45", "Green": "#21C354"}
+
+
+def member_positions(processed_df, filter_tag="All", ascending=True, scores=None):
+    """
+    Selects and orders the members to list without copying the shared table.
+
+    Args:
+        processed_df (pd.DataFrame): get_processed_member_data().
+        filter_tag (str): "All", or the membership_tag to keep.
+        ascending (bool): Order by days left; members who never paid come last.
+        scores (dict): Search scores by member_id (lower is better), see
+            MemberSearchIndex.scores(). Only matching members are kept, best
+            match first and by days left among equally good ones.
+
+    Returns:
+        np.ndarray: Row positions in processed_df, in display order.
+    """
+    days_left = processed_df['days_left'].to_numpy(dtype='float64')
+    positions = np.argsort(days_left if ascending else -days_left, kind='stable')  # NaN sorts last
+
+    if filter_tag != "All":
+        positions = positions[(processed_df['membership_tag'] == filter_tag).to_numpy()[positions]]
+
+    if scores is not None:
+        member_ids = processed_df['member_id'].to_numpy()[positions]
+        member_scores = pd.Series(scores, dtype='float64').reindex(member_ids).to_numpy()
+        found = ~np.isnan(member_scores)
+        positions = positions[found][np.argsort(member_scores[found], kind='stable')]
+    return positions
+
 
 def app():
     cloudinary.config(
@@ -41,17 +83,15 @@ def app():
         else:
             return None  # Invalid phone number
 
-    def update_phone_number(client, member_id, new_phone_number):
-        spreadsheet_id = st.secrets["google_sheets"]["spreadsheet_id"]
-        members_sheet = client.open_by_key(spreadsheet_id).worksheet('Members')
+    def update_phone_number(member_id, new_phone_number):
+        storage = get_storage()
 
         # Find the row number where the member_id is located
-        cell = members_sheet.find(str(member_id))
-        if cell:
-            row_number = cell.row
+        row_number = storage.find_row('Members', 'member_id', member_id)
+        if row_number:
             # Assuming 'phone_number' is in column 4 (adjust the index as per your sheet)
             phone_number_col_index = members_df.columns.get_loc('phone_number') + 1  # Adding 1 because Google Sheets index starts at 1
-            members_sheet.update_cell(row_number, phone_number_col_index, new_phone_number)
+            storage.update_cells('Members', [(row_number, phone_number_col_index, new_phone_number)])
         else:
             st.error(f"Member ID {member_id} not found in the sheet.")
 
@@ -70,142 +110,19 @@ def app():
         whatsapp_url = f"https://wa.me/{formatted_number}?text={encoded_message}"
         return whatsapp_url
 
-    # Define membership types and payment methods
-    membership_types = {
-        "BULANAN": {"id": 1, "duration": 30}
-    }
-    payment_types = {
-        "Cash": {"id": 1, "payment_method": 'cash'},
-        "Trf/Qris": {"id": 2, "payment_method": 'e-money'},
-    }
-
-    # Function to calculate membership expiration date
-    def calculate_expiration(last_transaction_date, duration_days):
-        return last_transaction_date + timedelta(days=duration_days)
-
-    # Initialize Google Sheets connection (without caching)
-    def init_connection():
-        scope = [
-            "https://spreadsheets.google.com/feeds",
-            "https://www.googleapis.com/auth/spreadsheets",
-            "https://www.googleapis.com/auth/drive.file",
-            "https://www.googleapis.com/auth/drive"
-        ]
-        creds = service_account.Credentials.from_service_account_info(
-                st.secrets["gcp_service_account"],
-                scopes=scope
-            )
-        client = gspread.authorize(creds)
-        return client
-
-    # Fetch data from Google Sheets (without caching)
-    def get_member_data(_client):
-        spreadsheet_id = st.secrets["google_sheets"]["spreadsheet_id"]
-        members_sheet = _client.open_by_key(spreadsheet_id).worksheet('Members')
-        transactions_sheet = _client.open_by_key(spreadsheet_id).worksheet('Transactions')
-
-        members_data = members_sheet.get_all_records()
-        transactions_data = transactions_sheet.get_all_records()
-
-        members_df = pd.DataFrame(members_data)
-        transactions_df = pd.DataFrame(transactions_data)
-
-        # Enforce correct data types
-        members_df['member_id'] = pd.to_numeric(members_df['member_id'], errors='coerce')
-        transactions_df['member_id'] = pd.to_numeric(transactions_df['member_id'], errors='coerce')
-        transactions_df['membership_types_id'] = pd.to_numeric(transactions_df['membership_types_id'], errors='coerce')
-        transactions_df['transaction_date'] = pd.to_datetime(transactions_df['transaction_date'], errors='coerce')
-
-        # Ensure phone_number is a string
-        members_df['phone_number'] = members_df['phone_number'].astype(str)
-        members_df['nick_name'] = members_df['nick_name'].astype(str)
-        members_df['full_name'] = members_df['full_name'].astype(str)
-
-        # Drop rows with NaN in critical columns
-        members_df = members_df.dropna(subset=['member_id'])
-        transactions_df = transactions_df.dropna(subset=['member_id', 'membership_types_id', 'transaction_date'])
-
-        # Cast to integer type
-        members_df['member_id'] = members_df['member_id'].astype(int)
-        transactions_df['member_id'] = transactions_df['member_id'].astype(int)
-        transactions_df['membership_types_id'] = transactions_df['membership_types_id'].astype(int)
-
-        return members_df, transactions_df
-
-    # Function to add a new transaction
-    def add_transaction(client, transaction_id, member_id, membership_types_id, transaction_type, amount, payment_method, transaction_date, note):
-        spreadsheet_id = st.secrets["google_sheets"]["spreadsheet_id"] 
-        transactions_sheet = client.open_by_key(spreadsheet_id).worksheet('Transactions')
-
-        # Ensure all values are strings to prevent misinterpretation
-        new_transaction = [
-            str(transaction_id),       # Transaction ID as string
-            str(member_id),            # Member ID as string
-            str(membership_types_id),  # Membership Type ID as string
-            transaction_type,          # Transaction type
-            str(amount),               # Amount as string
-            payment_method,            # Payment method
-            transaction_date,          # Transaction date as string
-            note                       # Note
-        ]
-        transactions_sheet.append_row(new_transaction, value_input_option='RAW')  # Use 'RAW' to prevent Google Sheets from auto-formatting
-
-    # Create a reverse lookup for membership types
-    membership_type_by_id = {v['id']: {'name': k, 'duration': v['duration']} for k, v in membership_types.items()}
-
-    # Function to process member data and assign tags
-    def process_member_data(members_df, transactions_df):
-        # Merge members_df with transactions_df to get the last transaction for each member
-        transactions_df = transactions_df.sort_values(by='transaction_date')
-        last_transactions = transactions_df.groupby('member_id').last().reset_index()
-
-        members_with_last_tx = pd.merge(members_df, last_transactions[['member_id', 'transaction_date', 'membership_types_id']], on='member_id', how='left')
-
-        # Calculate membership_expiration
-        def calculate_expiration(row):
-            last_transaction_date = row['transaction_date']
-            membership_type_id = row['membership_types_id']
-            if pd.isnull(last_transaction_date) or pd.isnull(membership_type_id):
-                return None  # No transactions found
-            duration_days = membership_type_by_id.get(membership_type_id, {}).get('duration', 0)
-            return last_transaction_date + timedelta(days=duration_days)
-
-        members_with_last_tx['membership_expiration'] = members_with_last_tx.apply(calculate_expiration, axis=1)
-
-        # Calculate days_left
-        today = datetime.now().date()
-        members_with_last_tx['days_left'] = members_with_last_tx['membership_expiration'].apply(lambda x: (x.date() - today).days if pd.notnull(x) else None)
-
-        # Assign membership_tag
-        def assign_membership_tag(days_left):
-            if days_left is None or days_left < 0:
-                return "Red"
-            elif days_left <= 3:
-                return "Yellow"
-            else:
-                return "Green"
-
-        members_with_last_tx['membership_tag'] = members_with_last_tx['days_left'].apply(assign_membership_tag)
-
-        return members_with_last_tx
+    # The tables are shared by every session; nothing is copied per session
+    members_df, _ = get_member_data()
 
-    # Remove refresh_counter logic since we're using session state
-    # Initialize session state variables
-
-    st.session_state['client'] = init_connection()
-    st.session_state['members_df'], st.session_state['transactions_df'] = get_member_data(st.session_state['client'])
-    
-    # Use data from session state
-    client = st.session_state['client']
-    members_df = st.session_state['members_df']
-    transactions_df = st.session_state['transactions_df']
-
-    # Process member data
-    members_processed_df = process_member_data(members_df, transactions_df)
+    # Process member data (shared, computed once per version of the tables)
+    members_processed_df = get_processed_member_data()
 
     # Streamlit page setup
     st.title("Member List")
 
+    notice = st.session_state.pop('member_list_notice', None)
+    if notice:
+        st.toast(notice)
+
     # Filter setup
     search_name = st.text_input("Search", key="search")
 
@@ -217,51 +134,178 @@ def app():
     with col2:
         sort_order = st.selectbox("Sort by days left", ["Ascending", "Descending"])
 
-    st.markdown("---")
+    col3, col4 = st.columns(2)
 
-    # Apply filters
-    filtered_df = members_processed_df.copy()
+    with col3:
+        view_mode = st.radio("View", ["Cards", "Compact grid"], horizontal=True, key="view_mode")
 
-    if filter_tag != "All":
-        filtered_df = filtered_df[filtered_df['membership_tag'] == filter_tag]
+    with col4:
+        page_size_options = sorted({10, 20, 50, 100, DEFAULT_PAGE_SIZE})
+        page_size = st.selectbox(
+            "Members per page",
+            page_size_options,
+            index=page_size_options.index(DEFAULT_PAGE_SIZE),
+            key="page_size"
+        )
 
-    # Apply search filter
-    if search_name:
-        filtered_df = filtered_df[
-            filtered_df['nick_name'].str.lower().str.contains(search_name.lower()) |
-            filtered_df['full_name'].str.lower().str.contains(search_name.lower())
-        ]
+    st.markdown("---")
 
-    # Apply sorting
-    ascending_order = True if sort_order == "Ascending" else False
-    filtered_df = filtered_df.sort_values(by='days_left', ascending=ascending_order, na_position='last')
+    # Apply filters, sorting and the search (name words, typos included, or
+    # phone number) as row positions; only the rows shown are taken out
+    positions = member_positions(
+        members_processed_df,
+        filter_tag,
+        ascending=sort_order == "Ascending",
+        scores=get_search_index().scores(search_name) if search_name else None
+    )
 
-    # Initialize session state for toggling forms
-    if 'show_form' not in st.session_state:
-        st.session_state['show_form'] = {}
+    # Open renewal forms by member_id. Closed ones are removed, so the state
+    # stays small however many members there are.
+    open_forms = st.session_state.setdefault('show_form', {})
 
     # Define the message template
     MESSAGE_TEMPLATE = "Good day, resident of Brotot Barbell Club!\nPlease renew your gym membership as soon as possible!\n\nBest Regards,\nIdam"
 
-    # Display each member's details in cards
-    for index, row in filtered_df.iterrows():
-        member_id = row['member_id']
-        membership_expiration = row['membership_expiration']
-        days_left = row['days_left']
-        membership_tag = row['membership_tag']
+    def show_form(member_id, show):
+        if show:
+            open_forms[member_id] = True
+        else:
+            open_forms.pop(member_id, None)
+
+    # Renewal workflow of one card. As a fragment, opening, cancelling or
+    # filling in the form only reruns this block, not the whole page.
+    @st.fragment
+    def renewal_workflow(member_id, nick_name):
+        st.button("Renew Membership", key=f"renew_{member_id}", on_click=show_form, args=(member_id, True))
+
+        if open_forms.get(member_id):
+            with st.form(key=f"renew_form_{member_id}"):
+                st.write("**Renew Membership**")
+                amount = st.number_input("Amount", min_value=0.0, value=80.0, key=f"amount_{member_id}")
+                payment_method_key = st.selectbox("Payment Method", list(payment_types.keys()), key=f"payment_{member_id}")
+                payment_method = payment_types[payment_method_key]["payment_method"]
+                duration_days = st.number_input("Duration (days)", min_value=1, value=30, key=f"duration_{member_id}")
+                transaction_date_input = st.date_input("Membership Start Date", datetime.today(), key=f"trans_date_{member_id}")
+
+                # Optional: Add a field for notes
+                note = st.text_input("Note (optional)", key=f"note_{member_id}")
+
+                submitted = st.form_submit_button("Submit")
+                if submitted:
+                    # Ensure member_id is correctly typed
+                    member_id_str = str(member_id)
+                    # Generate transaction_id
+                    transaction_id = f"{transaction_date_input.strftime('%Y%m%d')}-{member_id_str}"
+                    membership_type_id = 1  # Assuming a fixed membership type for simplicity
+                    transaction_type = "renewal"
+
+                    transaction_date_str = transaction_date_input.strftime('%Y-%m-%d')
+
+                    entry_ids = queue_transactions([{
+                        'transaction_id': transaction_id,
+                        'member_id': member_id_str,
+                        'membership_types_id': membership_type_id,
+                        'transaction_type': transaction_type,
+                        'amount': amount,
+                        'payment_method': payment_method,
+                        'transaction_date': transaction_date_str,
+                        'note': note,
+                        'duration_days': duration_days
+                    }])
+                    if entry_ids[0] is None:
+                        st.warning(f"{nick_name} already has a renewal starting on {transaction_date_str}.")
+                        return
+                    # Saved locally at this point. Once written, the new row is
+                    # in the shared tables and the sidebar reruns the page, so
+                    # every card's status is updated without a request.
+                    show_form(member_id, False)
+                    st.session_state['member_list_notice'] = (
+                        f"Membership renewed for {nick_name}! It is saved and will reach Google Sheets shortly."
+                    )
+                    st.rerun()
+
+            st.button("Cancel", key=f"cancel_{member_id}", on_click=show_form, args=(member_id, False))
+
+    # Renew many members at once (e.g. at the start of the month): one row per
+    # selected member, all sent with a single append request. The picker lists
+    # every filtered member, so it is only built (and sent) while bulk mode
+    # is on; otherwise reruns stay the same size however many members match.
+    @st.fragment
+    def bulk_renewal(processed_df, positions):
+        report = st.session_state.pop('bulk_renewal_report', None)
+        if report is not None:
+            st.session_state['bulk_renewal_open'] = True
+        if not st.toggle("Bulk renewal", key="bulk_renewal_open"):
+            return
+        with st.container(border=True):
+            if report:
+                st.dataframe(pd.DataFrame(report), hide_index=True, use_container_width=True)
+
+            candidates_df = processed_df[['member_id', 'nick_name', 'full_name']].iloc[positions]
+            labels = dict(zip(
+                candidates_df['member_id'].tolist(),
+                candidates_df['nick_name'] + ' (' + candidates_df['full_name'] + ')'
+            ))
+            with st.form("bulk_renewal_form", clear_on_submit=True):
+                member_ids = st.multiselect("Members to renew", list(labels), format_func=labels.get)
+                col1, col2 = st.columns(2)
+                with col1:
+                    amount = st.number_input("Amount", min_value=0.0, value=80.0)
+                    duration_days = st.number_input("Duration (days)", min_value=1, value=30)
+                with col2:
+                    payment_method_key = st.selectbox("Payment Method", list(payment_types.keys()))
+                    transaction_date_input = st.date_input("Membership Start Date", datetime.today())
+                note = st.text_input("Note (optional)")
+                submitted = st.form_submit_button("Renew selected members")
+
+            if submitted:
+                if not member_ids:
+                    st.warning("Select at least one member to renew.")
+                    return
+                transactions = [
+                    {
+                        'transaction_id': f"{transaction_date_input.strftime('%Y%m%d')}-{member_id}",
+                        'member_id': member_id,
+                        'membership_types_id': 1,  # Assuming a fixed membership type for simplicity
+                        'transaction_type': "renewal",
+                        'amount': amount,
+                        'payment_method': payment_types[payment_method_key]["payment_method"],
+                        'transaction_date': transaction_date_input.strftime('%Y-%m-%d'),
+                        'note': note,
+                        'duration_days': duration_days
+                    }
+                    for member_id in member_ids
+                ]
+                # Journaled locally, then sent with a single append request
+                entry_ids = queue_transactions(transactions)
+                st.session_state['bulk_renewal_report'] = [
+                    {
+                        'Member': labels[transaction['member_id']],
+                        'Transaction ID': transaction['transaction_id'],
+                        'Result': "Skipped, already recorded" if entry_id is None else "Renewed"
+                    }
+                    for transaction, entry_id in zip(transactions, entry_ids)
+                ]
+                renewed = len(entry_ids) - entry_ids.count(None)
+                st.session_state['member_list_notice'] = (
+                    f"{renewed} of {len(entry_ids)} memberships renewed! "
+                    "They are saved and will reach Google Sheets shortly."
+                )
+                st.rerun()
+
+    # Render one member as a full card with its renewal workflow
+    def render_member_card(row):
+        member_id = int(row['member_id'])
+        days_left = None if pd.isnull(row['days_left']) else int(row['days_left'])
 
         with st.container():
             cols = st.columns([1, 2])
 
             with cols[0]:
                 st.markdown(f"""
-                <img src="{row['photo_url']}" style="width:200px; height:266px; object-fit:cover; border-radius:10px;">
+                <img src="{html.escape(thumbnail_url(row['photo_url']))}" loading="lazy" style="width:200px; height:266px; object-fit:cover; border-radius:10px;">
                 """, unsafe_allow_html=True)
             with cols[1]:
-                st.markdown("""
-                    <link href="https://fonts.googleapis.com/css2?family=Holtwood+One+SC&display=swap" rel="stylesheet">
-                    """, unsafe_allow_html=True)
-
                 st.markdown(f"""
                     <span style='font-family: "Holtwood One SC", serif;
                     font-weight: 400;
@@ -289,68 +333,80 @@ def app():
                 else:
                     st.success(f"Membership expires in {days_left} days.")
 
-                if f"show_form_{index}" not in st.session_state:
-                    st.session_state[f"show_form_{index}"] = False
-
-                if st.button("Renew Membership", key=f"renew_{index}"):
-                    st.session_state[f"show_form_{index}"] = True
-
-                if st.session_state[f"show_form_{index}"]:
-                    with st.form(key=f"renew_form_{index}"):
-                        st.write("**Renew Membership**")
-                        amount = st.number_input("Amount", min_value=0.0, value=80.0, key=f"amount_{index}")
-                        payment_method_key = st.selectbox("Payment Method", list(payment_types.keys()), key=f"payment_{index}")
-                        payment_method = payment_types[payment_method_key]["payment_method"]
-                        duration_days = st.number_input("Duration (days)", min_value=1, value=30, key=f"duration_{index}")
-                        transaction_date_input = st.date_input("Membership Start Date", datetime.today(), key=f"trans_date_{index}")
-
-                        # Optional: Add a field for notes
-                        note = st.text_input("Note (optional)", key=f"note_{index}")
-
-                        submitted = st.form_submit_button("Submit")
-                        if submitted:
-                            # Ensure member_id is correctly typed
-                            member_id_str = str(member_id)
-                            # Generate transaction_id
-                            transaction_id = f"{transaction_date_input.strftime('%Y%m%d')}-{member_id_str}"
-                            membership_type_id = 1  # Assuming a fixed membership type for simplicity
-                            transaction_type = "renewal"
-
-                            transaction_date_str = transaction_date_input.strftime('%Y-%m-%d')
-
-                            add_transaction(
-                                client,
-                                transaction_id,
-                                member_id_str,
-                                membership_type_id,
-                                transaction_type,
-                                amount,
-                                payment_method,
-                                transaction_date_str,
-                                note
-                            )
-                            st.success("Membership renewed!")
-
-                            # Remove data from session state to force refresh
-                            del st.session_state['members_df']
-                            del st.session_state['transactions_df']
-
-                            # Re-fetch the data and store it in session state
-                            st.session_state['members_df'], st.session_state['transactions_df'] = get_member_data(client)
-                            members_processed_df = process_member_data(st.session_state['members_df'], st.session_state['transactions_df'])
-
-                            # Re-apply filters
-                            filtered_df = members_processed_df.copy()
-                            if filter_tag != "All":
-                                filtered_df = filtered_df[filtered_df['membership_tag'] == filter_tag]
-                            if search_name:
-                                filtered_df = filtered_df[
-                                    filtered_df['nick_name'].str.lower().str.contains(search_name.lower()) |
-                                    filtered_df['full_name'].str.lower().str.contains(search_name.lower())
-                                ]
-                            st.session_state[f"show_form_{index}"] = False
-
-                    if st.button("Cancel", key=f"cancel_{index}"):
-                        st.session_state[f"show_form_{index}"] = False
+                renewal_workflow(member_id, row['nick_name'])
 
             st.divider()
+
+    # Render a whole page of members as one HTML grid (a single element)
+    def render_member_grid(page_df):
+        cards = []
+        for row in page_df.itertuples(index=False):
+            days_left = None if pd.isnull(row.days_left) else int(row.days_left)
+            if days_left is None or days_left < 0:
+                status = f"Expired {abs(days_left) if days_left is not None else ''} days ago"
+            else:
+                status = f"Expires in {days_left} days"
+            formatted_phone = format_phone_number(row.phone_number)
+            if formatted_phone:
+                contact = f'<a href="{html.escape(create_whatsapp_link(formatted_phone, MESSAGE_TEMPLATE))}" target="_blank">Send Whatsapp Message</a>'
+            else:
+                contact = f"{html.escape(str(row.phone_number))} (Invalid Format)"
+            cards.append(f"""
+                <div class="member-grid-card">
+                    <img src="{html.escape(thumbnail_url(row.photo_url))}" loading="lazy">
+                    <div class="member-grid-name">{html.escape(str(row.nick_name))}</div>
+                    <div class="member-grid-status" style="color:{TAG_COLORS[row.membership_tag]};">{status}</div>
+                    <div>{contact}</div>
+                </div>""")
+
+        st.markdown(f"""
+            <style>
+            .member-grid {{ display: grid; grid-template-columns: repeat(auto-fill, minmax(160px, 1fr)); gap: 16px; }}
+            .member-grid-card img {{ width: 100%; aspect-ratio: 200 / 266; object-fit: cover; border-radius: 10px; }}
+            .member-grid-name {{ font-family: "Holtwood One SC", serif; font-size: 20px; color: #FFFFFF; }}
+            .member-grid-status {{ font-weight: 600; }}
+            </style>
+            <div class="member-grid">{''.join(cards)}</div>
+            """, unsafe_allow_html=True)
+
+    # Page controls; callbacks run before the rerun so the new page shows at once
+    def change_page(step):
+        st.session_state['member_list_page'] += step
+
+    def render_page_controls(page, page_count, position):
+        prev_col, info_col, next_col = st.columns([1, 2, 1])
+        with prev_col:
+            st.button("Previous", key=f"page_prev_{position}", on_click=change_page, args=(-1,), disabled=page == 0)
+        with info_col:
+            st.markdown(f"<p style='text-align: center;'>Page {page + 1} of {page_count}</p>", unsafe_allow_html=True)
+        with next_col:
+            st.button("Next", key=f"page_next_{position}", on_click=change_page, args=(1,), disabled=page >= page_count - 1)
+
+    # Only the current page is rendered, so the element count stays the same
+    # however many members match
+    page_count = max(1, math.ceil(len(positions) / page_size))
+    filter_state = (search_name, filter_tag, sort_order, page_size)
+    if st.session_state.get('member_list_filters') != filter_state:
+        st.session_state['member_list_filters'] = filter_state
+        st.session_state['member_list_page'] = 0  # New results start on the first page
+    page = min(st.session_state['member_list_page'], page_count - 1)
+    st.session_state['member_list_page'] = page
+    page_df = members_processed_df.iloc[positions[page * page_size:(page + 1) * page_size]]
+
+    bulk_renewal(members_processed_df, positions)
+
+    st.caption(f"{len(positions)} members")
+    render_page_controls(page, page_count, "top")
+
+    st.markdown("""
+        <link href="https://fonts.googleapis.com/css2?family=Holtwood+One+SC&display=swap" rel="stylesheet">
+        """, unsafe_allow_html=True)
+
+    with span("render_cards"):
+        if view_mode == "Compact grid":
+            render_member_grid(page_df)
+        else:
+            for _, row in page_df.iterrows():
+                render_member_card(row)
+
+    render_page_controls(page, page_count, "bottom")
@@ -0,0 +1,170 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+from datetime import datetime
+from data import get_member_data, snapshot_key
+from tracing import traced
+
+# Define membership types and payment methods
+membership_types = {
+    "BULANAN": {"id": 1, "duration": 30}
+}
+payment_types = {
+    "Cash": {"id": 1, "payment_method": 'cash'},
+    "Trf/Qris": {"id": 2, "payment_method": 'e-money'},
+}
+
+# Choices offered by the registration and edit forms
+genders = ["Male", "Female", "Other"]
+workout_times = ["8am-10am", "11am-12pm", "1pm-3pm", "4pm-6pm", "6pm-7pm", "7pm-8pm", "8pm-9pm", "9pm-10pm"]
+
+MEMBERSHIP_TAGS = ["Red", "Yellow", "Green"]
+
+# Duration in days indexed by membership_types_id; unknown ids last 0 days
+_duration_by_type_id = np.zeros(max(v['id'] for v in membership_types.values()) + 1, dtype='int64')
+for _membership_type in membership_types.values():
+    _duration_by_type_id[_membership_type['id']] = _membership_type['duration']
+
+
+def membership_durations(membership_types_ids):
+    """
+    Looks up the duration of many membership types at once.
+
+    Args:
+        membership_types_ids (array-like): Membership type IDs, may hold NaN.
+
+    Returns:
+        np.ndarray: Duration in days for each ID (0 when unknown or missing).
+    """
+    ids = np.asarray(membership_types_ids, dtype='float64')
+    known = (ids >= 0) & (ids < len(_duration_by_type_id))  # False for NaN
+    return np.where(known, _duration_by_type_id[np.where(known, ids, 0).astype('int64')], 0)
+
+
+def transaction_durations(transactions_df):
+    """
+    Returns the days of membership bought by each transaction.
+
+    Uses the recorded duration_days, falling back to the duration of the
+    membership type for rows written before durations were recorded.
+    """
+    type_durations = membership_durations(transactions_df['membership_types_id'])
+    if 'duration_days' not in transactions_df:
+        return type_durations
+    recorded = transactions_df['duration_days'].to_numpy(dtype='float64')
+    return np.where(np.isnan(recorded), type_durations, recorded).astype('int64')
+
+
+def _stable_argsort(values):
+    # numpy radix-sorts 16-bit integers, which is much faster than its
+    # general stable sort; day numbers and member IDs usually fit
+    if len(values) and values.max() - values.min() < 2 ** 16:
+        return np.argsort((values - values.min()).astype('uint16'), kind='stable')
+    return np.argsort(values, kind='stable')
+
+
+def membership_coverage(transactions_df):
+    """
+    Computes each member's paid-through date from their full history.
+
+    A membership bought while the previous one is still running starts when
+    that one ends, so early renewals extend the current period instead of
+    overlapping it.
+
+    Args:
+        transactions_df (pd.DataFrame): Transactions table.
+
+    Returns:
+        pd.DataFrame: One row per member_id with the transaction_date and
+        membership_types_id of their last transaction and the
+        membership_expiration their payments cover them until.
+    """
+    member_ids = transactions_df['member_id'].to_numpy()
+    start = transactions_df['transaction_date'].to_numpy().astype('datetime64[D]').astype('int64')
+    duration = transaction_durations(transactions_df)
+
+    # Replay every member's transactions in date order. Both sorts are
+    # stable, so rows on the same date keep the order they were appended in.
+    order = _stable_argsort(start)
+    order = order[_stable_argsort(member_ids[order])]
+    member_ids, start, duration = member_ids[order], start[order], duration[order]
+
+    is_first = np.ones(len(member_ids), dtype=bool)
+    is_first[1:] = member_ids[1:] != member_ids[:-1]
+    is_last = np.append(is_first[1:], True)[:len(member_ids)]
+    group = np.cumsum(is_first) - 1
+
+    # Coverage after transaction i is end_i = max(end_i-1, start_i) + duration_i.
+    # Unrolled, end_i = paid_i + max over j <= i of (start_j - paid_j-1), where
+    # paid is the member's running total of days bought, so it only needs a
+    # grouped cumsum and a grouped cummax.
+    running = np.cumsum(duration)
+    paid = running - (running - duration)[is_first][group]
+    candidate = start - (paid - duration)
+    if len(candidate):
+        # Lift each member's values above the previous member's so a single
+        # running maximum never carries over from one member to the next
+        low = candidate.min()
+        lift = group * (candidate.max() - low + 1)
+        latest_start = np.maximum.accumulate(candidate - low + lift) - lift + low
+    else:
+        latest_start = candidate
+    end = paid + latest_start
+
+    coverage = transactions_df.iloc[order[is_last]][['member_id', 'transaction_date', 'membership_types_id']]
+    coverage['membership_expiration'] = end[is_last].astype('datetime64[D]').astype('datetime64[ns]')
+    return coverage
+
+
+@traced()
+def process_member_data(members_df, transactions_df, today=None):
+    """
+    Adds each member's membership status, computed without per-row Python.
+
+    Args:
+        members_df (pd.DataFrame): Members table.
+        transactions_df (pd.DataFrame): Transactions table.
+        today (datetime.date): Reference date, defaults to the current date.
+
+    Returns:
+        pd.DataFrame: members_df with the last transaction_date and
+        membership_types_id, plus membership_expiration, days_left and
+        membership_tag ("Red", "Yellow" or "Green").
+    """
+    if today is None:
+        today = datetime.now().date()
+
+    members_with_last_tx = pd.merge(members_df, membership_coverage(transactions_df), on='member_id', how='left')
+
+    # Calculate days_left
+    expiration = members_with_last_tx['membership_expiration']
+    members_with_last_tx['days_left'] = (expiration - pd.Timestamp(today)).dt.days
+
+    # Assign membership_tag; members without any transaction are expired
+    days_left = members_with_last_tx['days_left']
+    members_with_last_tx['membership_tag'] = pd.Categorical(
+        np.select(
+            [days_left.isna() | (days_left < 0), days_left <= 3],
+            ["Red", "Yellow"],
+            default="Green"
+        ),
+        categories=MEMBERSHIP_TAGS
+    )
+
+    return members_with_last_tx
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _processed_member_data(key, today, _members_df, _transactions_df):
+    return process_member_data(_members_df, _transactions_df, today=today)
+
+
+def get_processed_member_data():
+    """
+    Returns process_member_data() of the current tables, computed once per
+    version of them and per day, and shared across sessions. Pages select
+    from it by position instead of copying it.
+    """
+    key = snapshot_key()  # Taken first: a change racing the read only costs a recompute
+    members_df, transactions_df = get_member_data()
+    return _processed_member_data(key, datetime.now().date(), members_df, transactions_df)
@@ -1,13 +1,12 @@
-from google.oauth2 import service_account
 import streamlit as st
-import gspread
-from cloudinary.uploader import upload as cloudinary_upload
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import os
-import tempfile
-from PIL import Image  # Pillow library for image processing
 from datetime import date
 import cloudinary
+from images import delete_photo, describe_savings, upload_photo
+from data import allocate_member_id, queue_member
+from membership import genders, membership_types, payment_types, workout_times
+from tracing import bind_trace
 
 
 def app():
@@ -32,70 +31,6 @@ def app():
         api_secret=st.secrets['cloudinary']['api_secret']   # Your Cloudinary API secret
     )
 
-    # Initialize Google Sheets connection
-    def init_connection():
-        scope = [
-            "https://spreadsheets.google.com/feeds",
-            'https://www.googleapis.com/auth/spreadsheets',
-            "https://www.googleapis.com/auth/drive.file",
-            "https://www.googleapis.com/auth/drive"
-        ]
-        creds = service_account.Credentials.from_service_account_info(
-                    st.secrets["gcp_service_account"],
-                    scopes=scope
-                )
-        client = gspread.authorize(creds)
-        
-        # Access the Members and Transactions Sheets
-        spreadsheet_id = st.secrets["google_sheets"]["spreadsheet_id"]
-        members_sheet = client.open_by_key(spreadsheet_id).worksheet('Members')
-        transactions_sheet = client.open_by_key(spreadsheet_id).worksheet('Transactions')
-
-        return client, members_sheet, transactions_sheet
-
-    client, members_sheet, transactions_sheet = init_connection()
-
-    # Define membership types and their durations
-    membership_types = {
-        "BULANAN": {"id": 1, "duration": 30}
-    }
-    payment_types = {
-        "Cash": {"id": 1, "payment_method": 'cash'},  
-        "Trf/Qris": {"id": 2, "payment_method": 'e-money'}, 
-    }
-
-    # Resize and upload image to Cloudinary
-    def upload_image_to_cloudinary(file):
-        temp_file_path = None
-        
-        try:
-            # Open the uploaded image file using Pillow (not resizing here)
-            image = Image.open(file)
-
-            # Save the original image to a temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as temp_file:
-                image.save(temp_file, format='JPEG')
-                temp_file_path = temp_file.name  # Get the path of the temporary file
-
-            # Upload the original file to Cloudinary
-            upload_result = cloudinary.uploader.upload(temp_file_path, folder="gym_members")
-            if 'url' in upload_result:
-                return upload_result['url'], temp_file_path, 0  # Success
-            else:
-                return None, None, 1  # Error: No URL found in response
-
-        except Exception as e:
-            st.error(f"Error during image upload: {e}")
-            return None, None, 2  # Error during image upload
-
-        finally:
-            # Clean up the temporary file
-            if temp_file_path and os.path.exists(temp_file_path):
-                try:
-                    os.remove(temp_file_path)
-                except Exception as cleanup_error:
-                    st.error(f"Error cleaning up temporary file: {cleanup_error}")
-
     # Function to register a new member
     # Function to register a new member
     # ... [Your existing imports and functions]
@@ -105,14 +40,13 @@ def app():
         with st.form("register_form"):
             nick_name = st.text_input("Nickname", key="nick")
             full_name = st.text_input("Full Name", key="full")
-            gender = st.selectbox("Gender", ["Male", "Female", "Other"], key="gender")
+            gender = st.selectbox("Gender", genders, key="gender")
             birth_date = st.date_input("Date of Birth", value=datetime.today(), min_value=date(1950, 1, 1), max_value=datetime.today(), key="birth")
 
             phone_number = st.text_input("Phone Number", key="phone")
             medical_info = st.text_area("Medical Information", key="medical")
             fitness_goal = st.text_input("Fitness Goal", key="goal")
-            
-            workout_times = ["8am-10am", "11am-12pm", "1pm-3pm", "4pm-6pm", "6pm-7pm", "7pm-8pm", "8pm-9pm", "9pm-10pm"]
+
             preferred_workout_time = st.selectbox("Preferred Workout Time", workout_times, key="workout")
 
             membership_type = st.selectbox("Membership Type", list(membership_types.keys()), key="member_type")
@@ -135,43 +69,80 @@ def app():
                         st.error("Invalid phone number format. Please enter a valid Indonesian phone number.")
                     else:
                         with st.spinner("Uploading photo and registering member..."):
-                            photo_url, temp_file_path, upload_status = upload_image_to_cloudinary(photo)
-
-                            if upload_status == 0:  # Successful upload
-                                try:
-                                    member_id = len(members_sheet.get_all_records()) + 1
-                                    members_sheet.append_row([
-                                        member_id,
-                                        nick_name,
-                                        full_name,
-                                        gender,
-                                        str(birth_date),
-                                        formatted_phone,  # Store formatted phone number
-                                        medical_info,
-                                        fitness_goal,
-                                        preferred_workout_time,
-                                        photo_url
-                                    ])
-
-                                    transaction_id = f"{datetime.now().strftime('%Y%m%d')}-{member_id}"
-                                    membership_type_id = membership_types[membership_type]["id"]
-                                    amount = 100  # Assuming a fixed amount for simplicity
-                                    payment_method = payment_types[payment_method_key]["payment_method"]
-
-                                    transactions_sheet.append_row([
-                                        transaction_id,
-                                        member_id,
-                                        membership_type_id,
-                                        "signup",
-                                        amount,
-                                        payment_method,
-                                        str(transaction_date)
-                                    ])
-                                    st.success(f"Member '{full_name}' registered successfully with photo uploaded!")
-                                except Exception as e:
-                                    st.error(f"Error while updating spreadsheet: {e}")
-                            else:
-                                st.error("Failed to upload photo to Cloudinary.")
+                            register(
+                                photo,
+                                [
+                                    nick_name,
+                                    full_name,
+                                    gender,
+                                    str(birth_date),
+                                    formatted_phone,  # Store formatted phone number
+                                    medical_info,
+                                    fitness_goal,
+                                    preferred_workout_time
+                                ],
+                                membership_type,
+                                payment_method_key,
+                                transaction_date
+                            )
+
+    # Upload the photo while the member ID is reserved and the rows are
+    # prepared, then write both rows at once, so the clerk waits about as
+    # long as the slowest step instead of the sum of all of them
+    def register(photo, member_fields, membership_type, payment_method_key, transaction_date):
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            upload = pool.submit(bind_trace(upload_photo), photo)
+
+            try:
+                member_id = allocate_member_id()
+            except Exception as e:
+                st.error(f"Error while reserving a member ID: {e}")
+                member_id = None
+            else:
+                transaction = {
+                    'transaction_id': f"{datetime.now().strftime('%Y%m%d')}-{member_id}",
+                    'member_id': member_id,
+                    'membership_types_id': membership_types[membership_type]["id"],
+                    'transaction_type': "signup",
+                    'amount': 100,  # Assuming a fixed amount for simplicity
+                    'payment_method': payment_types[payment_method_key]["payment_method"],
+                    'transaction_date': str(transaction_date),
+                    'duration_days': membership_types[membership_type]["duration"]
+                }
+
+            try:
+                upload_result, photo_stats = upload.result()
+            except Exception as e:
+                st.error(f"Error during image upload: {e}")
+                return
+
+        if 'url' not in upload_result:
+            st.error("Failed to upload photo to Cloudinary.")
+            return
+        if member_id is None:
+            discard_photo(upload_result)
+            return
+        st.caption(describe_savings(photo_stats))
+
+        try:
+            queue_member([member_id] + member_fields + [upload_result['url']], transaction, photo=upload_result)
+        except Exception as e:
+            # Not even journaled, so no row will be written: the photo is orphaned
+            st.error(f"Error while saving the registration: {e}")
+            discard_photo(upload_result)
+            return
+        # Saved locally at this point; the sidebar tells when it reaches Google
+        # Sheets, or why it could not (the journal then deletes the photo)
+        st.success(
+            f"Member '{member_fields[1]}' registered with photo uploaded! "
+            "The registration is saved and will reach Google Sheets shortly."
+        )
+
+    def discard_photo(upload_result):
+        try:
+            delete_photo(upload_result)
+        except Exception:
+            pass  # Best effort, an orphaned photo only costs storage
 
     # Streamlit app entry point
     st.title('Sign Up')
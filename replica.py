@@ -0,0 +1,121 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import closing
+import pandas as pd
+from config import get_setting
+
+# Local SQLite copy of the spreadsheet, kept in sync in the background
+REPLICA_ENABLED = get_setting("replica", "enabled", True)
+REPLICA_PATH = get_setting(
+    "replica", "path",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'replica.sqlite3')
+)
+SYNC_INTERVAL_SECONDS = get_setting("replica", "sync_seconds", 60)
+
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _rows(frame):
+    # SQLite only stores Python scalars: dates become ISO text and NaN NULL
+    frame = frame.copy()
+    for column in frame.columns:
+        if pd.api.types.is_datetime64_any_dtype(frame[column]):
+            frame[column] = frame[column].dt.strftime('%Y-%m-%d %H:%M:%S')
+    frame = frame.astype(object)
+    return frame.where(frame.notna(), None).itertuples(index=False, name=None)
+
+
+class SheetReplica:
+    """
+    SQLite copy of the loaded worksheets and of the state needed to resume
+    syncing them.
+
+    A freshly started server can show the member list from this copy before
+    Google Sheets answers, and stays readable while Sheets is unreachable.
+    Every save is a single SQLite transaction, so the file never holds half
+    of a sync.
+    """
+
+    # Columns indexed in each table
+    INDEXES = {
+        'members': ['member_id'],
+        'transactions': ['member_id', 'transaction_date']
+    }
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.saved = {}  # Table name -> (generation, row count) in the file
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def save(self, tables, state):
+        """
+        Writes the tables and the sync state.
+
+        Args:
+            tables (dict): Table name -> (DataFrame, generation). While the
+                generation stays the same the table is treated as append-only
+                and only rows not saved yet are written; None rewrites it.
+            state (dict): JSON-serializable sync state, returned by load().
+        """
+        with self.lock, closing(self._connect()) as connection:
+            with connection:
+                for name, (frame, generation) in tables.items():
+                    frame = frame[[column for column in frame.columns if column != '']]
+                    saved_generation, saved_rows = self.saved.get(name, (None, 0))
+                    if generation is not None and generation == saved_generation and len(frame) >= saved_rows:
+                        new_rows = frame.iloc[saved_rows:]
+                    else:
+                        connection.execute(f"DROP TABLE IF EXISTS {_quote(name)}")
+                        connection.execute(
+                            f"CREATE TABLE {_quote(name)} ({', '.join(_quote(column) for column in frame.columns)})"
+                        )
+                        for column in self.INDEXES.get(name, []):
+                            if column in frame.columns:
+                                connection.execute(
+                                    f"CREATE INDEX {_quote(f'{name}_{column}')} ON {_quote(name)} ({_quote(column)})"
+                                )
+                        new_rows = frame
+                    if len(new_rows):
+                        placeholders = ', '.join('?' * len(frame.columns))
+                        connection.executemany(f"INSERT INTO {_quote(name)} VALUES ({placeholders})", _rows(new_rows))
+                saved = dict(self.saved)
+                saved.update({name: (generation, len(frame)) for name, (frame, generation) in tables.items()})
+                connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+                connection.execute("INSERT OR REPLACE INTO meta VALUES ('state', ?)", (json.dumps(state),))
+                connection.execute("INSERT OR REPLACE INTO meta VALUES ('saved', ?)", (json.dumps(saved),))
+            self.saved = saved  # Only once the transaction is committed
+
+    def load(self, names):
+        """
+        Reads the tables and sync state saved by save().
+
+        Args:
+            names (list): Table names to read.
+
+        Returns:
+            tuple: ({table name: DataFrame}, state), or None when there is no
+            complete copy yet. Values come back as stored, so callers restore
+            their dtypes.
+        """
+        if not os.path.exists(self.path):
+            return None
+        with self.lock, closing(self._connect()) as connection:
+            try:
+                meta = dict(connection.execute("SELECT key, value FROM meta").fetchall())
+                if 'state' not in meta:
+                    return None
+                tables = {
+                    name: pd.read_sql_query(f"SELECT * FROM {_quote(name)} ORDER BY rowid", connection)
+                    for name in names
+                }
+            except (sqlite3.DatabaseError, pd.errors.DatabaseError):
+                return None  # Missing tables or a damaged file: start from Sheets
+        self.saved = {name: tuple(saved) for name, saved in json.loads(meta['saved']).items()}
+        return tables, json.loads(meta['state'])
@@ -0,0 +1,174 @@
+import bisect
+import re
+import unicodedata
+from collections import Counter, defaultdict
+import streamlit as st
+from data import get_member_data, snapshot_key
+
+# Scores of the ways a query word can match a name word; lower ranks first
+EXACT, PREFIX, SUBSTRING, TYPO = 0, 1, 2, 3
+
+# Typo candidates to confirm by edit distance, per query word
+FUZZY_CANDIDATES = 50
+
+
+def normalize(text):
+    """
+    Lowercases text and strips accents and punctuation.
+
+    Args:
+        text (str): e.g. 'Kadék  Putra-Wijaya'.
+
+    Returns:
+        str: e.g. 'kadek putra wijaya'.
+    """
+    text = unicodedata.normalize('NFKD', str(text))
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(re.sub(r'[^0-9a-z]+', ' ', text.lower()).split())
+
+
+def phone_digits(phone_number):
+    """Returns the national part of a phone number, so 0812, 62812 and +62812 match."""
+    digits = re.sub(r'\D', '', str(phone_number))
+    if digits.startswith('62'):
+        return digits[2:]
+    if digits.startswith('0'):
+        return digits[1:]
+    return digits
+
+
+def _trigrams(word):
+    padded = f"^{word}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _edit_distance(a, b, limit):
+    # Levenshtein distance with adjacent transpositions, giving up (and
+    # returning limit + 1) as soon as it must exceed limit
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2, previous = None, list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, char_b in enumerate(b, 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b)
+            )
+            if i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class MemberSearchIndex:
+    """
+    Name and phone lookup over the Members table.
+
+    Names are split into normalized words. A query word matches a name word
+    exactly, as a prefix, as a substring, or with a typo or two (found via
+    shared trigrams and confirmed by edit distance), so 'kdek' finds Kadek.
+    """
+
+    def __init__(self, members_df):
+        self.member_ids = members_df['member_id'].tolist()
+        # Arrow-backed strings are much faster to iterate as one list
+        self.phones = [phone_digits(phone) for phone in members_df['phone_number'].tolist()]
+
+        rows_by_word = defaultdict(set)
+        for row, (nick_name, full_name) in enumerate(zip(members_df['nick_name'].tolist(), members_df['full_name'].tolist())):
+            for word in normalize(nick_name).split() + normalize(full_name).split():
+                rows_by_word[word].add(row)
+        self.words = sorted(rows_by_word)
+        self.rows_by_word = {word: sorted(rows) for word, rows in rows_by_word.items()}
+
+        self.words_by_trigram = defaultdict(list)
+        for word in self.words:
+            for trigram in _trigrams(word):
+                self.words_by_trigram[trigram].append(word)
+
+    def _match_word(self, query_word):
+        # Best score of every row with a name word matching query_word
+        matches = {}
+
+        def add(word, score):
+            for row in self.rows_by_word[word]:
+                if score < matches.get(row, TYPO + 3):
+                    matches[row] = score
+
+        # Exact and prefix matches sit next to each other in the sorted words
+        position = bisect.bisect_left(self.words, query_word)
+        while position < len(self.words) and self.words[position].startswith(query_word):
+            word = self.words[position]
+            add(word, EXACT if word == query_word else PREFIX)
+            position += 1
+
+        for word in self.words:
+            if query_word in word and not word.startswith(query_word):
+                add(word, SUBSTRING)
+
+        if len(query_word) >= 3:
+            max_typos = 1 if len(query_word) <= 4 else 2
+            shared = Counter(
+                word for trigram in _trigrams(query_word) for word in self.words_by_trigram.get(trigram, ())
+            )
+            for word, _ in shared.most_common(FUZZY_CANDIDATES):
+                # Compare with the whole word and with its start, so a typo
+                # in a word that is not fully typed yet still matches
+                distance = min(
+                    _edit_distance(query_word, word, max_typos),
+                    _edit_distance(query_word, word[:len(query_word) + 1], max_typos)
+                )
+                if distance <= max_typos:
+                    add(word, TYPO + distance)
+        return matches
+
+    def scores(self, query):
+        """
+        Finds members matching a name or phone number query.
+
+        Args:
+            query (str): Words of a name (every word must match) or digits
+                of a phone number.
+
+        Returns:
+            dict: Score of each matching member_id; lower is a better match.
+        """
+        scores = None
+        for query_word in normalize(query).split():
+            matches = self._match_word(query_word)
+            if scores is None:
+                scores = matches
+            else:
+                scores = {row: score + matches[row] for row, score in scores.items() if row in matches}
+        scores = scores or {}
+
+        digits = phone_digits(query) if re.fullmatch(r'[\d\s+()-]+', query.strip()) else ''
+        if len(digits) >= 3:
+            for row, phone in enumerate(self.phones):
+                if digits in phone:
+                    scores[row] = EXACT
+
+        return {self.member_ids[row]: score for row, score in scores.items()}
+
+    def search(self, query):
+        """
+        Same as scores(), but returns the matching member_id list, best first.
+        """
+        scores = self.scores(query)
+        return sorted(scores, key=lambda member_id: (scores[member_id], member_id))
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _search_index(key, _members_df):
+    return MemberSearchIndex(_members_df)
+
+
+def get_search_index():
+    """Returns the search index of the current Members table, built once per version of it."""
+    key = snapshot_key()  # Taken first: a change racing the read only costs a rebuild
+    members_df, _ = get_member_data()
+    return _search_index(key, members_df)
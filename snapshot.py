@@ -0,0 +1,115 @@
+import json
+import os
+import threading
+import uuid
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from config import get_setting
+
+# Parquet snapshot of the replica's tables, saved by the same background
+# sync; a restarted server reads it first
+SNAPSHOT_ENABLED = get_setting("snapshot", "enabled", True)
+SNAPSHOT_PATH = get_setting(
+    "snapshot", "path",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'snapshot')
+)
+
+# Read strings back as Arrow-backed pandas strings, as the app keeps them
+_PANDAS_TYPES = {pa.string(): pd.StringDtype('pyarrow'), pa.large_string(): pd.StringDtype('pyarrow')}
+
+
+class SheetSnapshot:
+    """
+    Parquet snapshot of the loaded worksheets and of the state needed to
+    resume syncing them, with the same save() and load() as SheetReplica.
+
+    Unlike the SQLite replica, which stores plain values, the tables keep
+    their dtypes and are read memory-mapped, so a restarted server loads
+    them in a fraction of a second at any size. Files are never changed
+    once written and each save ends by replacing the manifest that lists
+    them, so the snapshot never holds half of a sync.
+    """
+
+    MANIFEST = 'manifest.json'
+    # Append-only tables get one file per save with new rows; past this many
+    # files the table is rewritten as one
+    MAX_PARTS = 20
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.saved = {}  # Table name -> {'generation', 'rows', 'files'} in the manifest
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _write(self, name, frame):
+        file_name = f"{name}-{uuid.uuid4().hex}.parquet"
+        pq.write_table(pa.Table.from_pandas(frame, preserve_index=False), self._file(file_name))
+        return file_name
+
+    def _read(self, files):
+        # Memory-mapped, so the files are decoded straight from the page cache
+        table = pa.concat_tables([pq.read_table(self._file(name), memory_map=True) for name in files])
+        return table.to_pandas(types_mapper=_PANDAS_TYPES.get)
+
+    def save(self, tables, state):
+        """
+        Writes the tables and the sync state.
+
+        Args:
+            tables (dict): Table name -> (DataFrame, generation). While the
+                generation stays the same the table is treated as append-only
+                and only rows not saved yet are written; None rewrites it.
+            state (dict): JSON-serializable sync state, returned by load().
+        """
+        with self.lock:
+            os.makedirs(self.path, exist_ok=True)
+            saved = dict(self.saved)
+            for name, (frame, generation) in tables.items():
+                frame = frame[[column for column in frame.columns if column != '']]
+                previous = self.saved.get(name)
+                if (
+                    previous and generation is not None and generation == previous['generation']
+                    and len(frame) >= previous['rows'] and len(previous['files']) < self.MAX_PARTS
+                ):
+                    files = list(previous['files'])
+                    if len(frame) > previous['rows']:
+                        files.append(self._write(name, frame.iloc[previous['rows']:]))
+                else:
+                    files = [self._write(name, frame)]
+                saved[name] = {'generation': generation, 'rows': len(frame), 'files': files}
+
+            with open(self._file(self.MANIFEST + '.part'), 'w', encoding='utf-8') as file:
+                json.dump({'state': state, 'saved': saved}, file)
+            os.replace(self._file(self.MANIFEST + '.part'), self._file(self.MANIFEST))
+            self.saved = saved  # Only once the manifest lists the new files
+
+            # Files of earlier saves are no longer listed anywhere
+            in_use = {name for table in saved.values() for name in table['files']}
+            for name in os.listdir(self.path):
+                if name.endswith('.parquet') and name not in in_use:
+                    os.remove(self._file(name))
+
+    def load(self, names):
+        """
+        Reads the tables and sync state saved by save().
+
+        Args:
+            names (list): Table names to read.
+
+        Returns:
+            tuple: ({table name: DataFrame}, state), or None when there is no
+            complete copy yet. The tables come back with the dtypes they
+            were saved with.
+        """
+        with self.lock:
+            try:
+                with open(self._file(self.MANIFEST), encoding='utf-8') as file:
+                    manifest = json.load(file)
+                tables = {name: self._read(manifest['saved'][name]['files']) for name in names}
+            except (OSError, ValueError, KeyError, pa.ArrowException):
+                return None  # No copy yet, or missing or damaged files: start from Sheets
+            self.saved = manifest['saved']
+        return tables, manifest['state']
@@ -0,0 +1,395 @@
+import json
+import os
+import random
+import re
+import threading
+import time
+from itertools import zip_longest
+import streamlit as st
+from gspread.exceptions import APIError, WorksheetNotFound
+from gspread.utils import a1_range_to_grid_range, rowcol_to_a1
+from config import get_setting
+from connection import get_spreadsheet, get_worksheet
+from tracing import count_api_call
+
+# Where the tables live: 'sheets' (Google Sheets) or 'memory', the offline
+# stand-in for tests and benchmarks. The memory backend starts from the JSON
+# file at [storage] path when set (and saves every write back to it), and can
+# slow down or fail requests on purpose.
+STORAGE_BACKEND = get_setting("storage", "backend", "sheets")
+MEMORY_PATH = get_setting("storage", "path", "")
+MEMORY_LATENCY_MS = get_setting("storage", "latency_ms", 0)
+MEMORY_ERROR_RATE = get_setting("storage", "error_rate", 0.0)
+
+# Layout of a new, empty spreadsheet
+EMPTY_WORKBOOK = {
+    'Members': [[
+        'member_id', 'nick_name', 'full_name', 'gender', 'birth_date', 'phone_number',
+        'medical_info', 'fitness_goal', 'preferred_workout_time', 'photo_url'
+    ]],
+    'Transactions': [[
+        'transaction_id', 'member_id', 'membership_types_id', 'transaction_type', 'amount',
+        'payment_method', 'transaction_date', 'note', 'duration_days'
+    ]]
+}
+
+_NUMBER = re.compile(r'^-?\d+(\.\d+)?$')
+
+
+class WorksheetExists(Exception):
+    """Raised by create_sheet() when the worksheet was already created."""
+
+
+class SheetsBackend:
+    """
+    Tables stored in the Google Sheets spreadsheet, one worksheet per table.
+
+    Rows and columns are numbered from 1, and row 1 of every worksheet holds
+    the column names. Every method is a single request unless noted.
+    """
+
+    def fetch_columns(self, ranges):
+        """
+        Reads several ranges with a single values.batchGet request.
+
+        Args:
+            ranges (list): A1 ranges, e.g. ['Members', 'Transactions!A1:H1'].
+
+        Returns:
+            list: For each range, its values as a list of columns. Trailing
+            empty cells and columns are left out, as Sheets does.
+        """
+        response = get_spreadsheet().values_batch_get(ranges, params={'majorDimension': 'COLUMNS'})
+        return [value_range.get('values', []) for value_range in response['valueRanges']]
+
+    def open_sheets(self, sheets):
+        """Opens worksheet handles ahead of the first write that needs them."""
+        for sheet in sheets:
+            get_worksheet(sheet)
+
+    def header(self, sheet):
+        """Returns the first row of a worksheet."""
+        return get_worksheet(sheet).row_values(1)
+
+    def add_columns(self, sheet, position, names):
+        """Writes column names into row 1 from column position on, growing the sheet if needed."""
+        worksheet = get_worksheet(sheet)
+        if worksheet.col_count < position + len(names) - 1:
+            worksheet.add_cols(position + len(names) - 1 - worksheet.col_count)
+        worksheet.update([names], rowcol_to_a1(1, position))
+
+    def append_rows(self, sheet, rows):
+        """
+        Appends rows below the last row holding data.
+
+        Values are stored as given (RAW input): numbers stay numbers and
+        everything else is text.
+
+        Returns:
+            int: Row number the first row landed on, or None if unknown.
+        """
+        response = get_worksheet(sheet).append_rows(rows, value_input_option='RAW')
+        updated_range = response.get('updates', {}).get('updatedRange', '')
+        if not updated_range:
+            return None
+        return a1_range_to_grid_range(updated_range.split('!')[-1])['startRowIndex'] + 1
+
+    def append_rows_atomically(self, rows_by_sheet):
+        """
+        Appends rows to several worksheets in one spreadsheets.batchUpdate,
+        which Google applies atomically: either every row is added or none is.
+
+        Args:
+            rows_by_sheet (dict): Worksheet name -> rows, with RAW input.
+        """
+        get_spreadsheet().batch_update({'requests': [
+            {'appendCells': {
+                'sheetId': get_worksheet(sheet).id,
+                'rows': [{'values': [_raw_cell(value) for value in row]} for row in rows],
+                'fields': 'userEnteredValue'
+            }}
+            for sheet, rows in rows_by_sheet.items()
+        ]})
+
+    def update_cells(self, sheet, cells):
+        """
+        Writes single cells, parsing values as if typed in.
+
+        Args:
+            cells (list): (row, col, value) tuples.
+        """
+        get_worksheet(sheet).batch_update(
+            [{'range': rowcol_to_a1(row, col), 'values': [[value]]} for row, col, value in cells],
+            raw=False
+        )
+
+    def find_row(self, sheet, column, value):
+        """
+        Returns the number of the first row whose column holds value, or None.
+        Costs two requests: one for the header, one for the search.
+        """
+        worksheet = get_worksheet(sheet)
+        header = self.header(sheet)
+        if column not in header:
+            return None
+        cell = worksheet.find(str(value), in_column=header.index(column) + 1)
+        return cell.row if cell else None
+
+    def create_sheet(self, sheet, rows):
+        """
+        Adds a worksheet holding rows.
+
+        Raises:
+            WorksheetExists: If a worksheet of that name exists, e.g. because
+                another process just created it.
+        """
+        try:
+            worksheet = get_spreadsheet().add_worksheet(sheet, rows=len(rows), cols=max(len(row) for row in rows))
+        except APIError as error:
+            if error.code == 400 and 'already exists' in str(error):
+                raise WorksheetExists(sheet) from error
+            raise
+        worksheet.update(rows, 'A1')
+
+    def read_cell(self, sheet, row, col):
+        """
+        Returns the value of a cell as text ('' when empty).
+
+        Raises:
+            WorksheetNotFound: If the worksheet does not exist.
+        """
+        return get_worksheet(sheet).acell(rowcol_to_a1(row, col)).value or ''
+
+    def replace_cell(self, sheet, row, col, expected, new):
+        """
+        Writes new into a cell only if it still holds expected, with one
+        find-and-replace request.
+
+        Returns:
+            bool: Whether the cell was changed.
+        """
+        response = get_spreadsheet().batch_update({'requests': [{'findReplace': {
+            'find': str(expected),
+            'replacement': str(new),
+            'matchEntireCell': True,
+            'range': {
+                'sheetId': get_worksheet(sheet).id,
+                'startRowIndex': row - 1, 'endRowIndex': row,
+                'startColumnIndex': col - 1, 'endColumnIndex': col
+            }
+        }}]})
+        return response['replies'][0].get('findReplace', {}).get('occurrencesChanged', 0) == 1
+
+
+def _raw_cell(value):
+    # Same result as append_row with RAW input: numbers stay numbers and
+    # everything else is stored as text, exactly as given
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {'userEnteredValue': {'numberValue': value}}
+    return {'userEnteredValue': {'stringValue': str(value)}}
+
+
+def _number_text(value):
+    # How Sheets shows a number with the default format
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class MemoryBackend:
+    """
+    Offline stand-in for SheetsBackend, with the same methods and semantics.
+
+    Worksheets are lists of rows of cell text, as Sheets returns them:
+    numbers written RAW or typed in show in the default number format, and
+    ranges come back without trailing empty cells. Every method call counts
+    as one request, which can be delayed by latency seconds and fails with a
+    ConnectionError (before changing anything) with probability error_rate.
+
+    Args:
+        sheets (dict): Worksheet name -> rows, to start from.
+        path (str): Optional JSON file to start from instead when it exists,
+            rewritten after every write.
+        latency (float): Seconds every request takes.
+        error_rate (float): Share of requests that fail.
+        seed: Seed of the random failures, for repeatable runs.
+    """
+
+    def __init__(self, sheets=None, path=None, latency=0.0, error_rate=0.0, seed=None):
+        self.path = path
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as file:
+                sheets = json.load(file)
+        self.sheets = {
+            name: [[str(value) for value in row] for row in rows]
+            for name, rows in (sheets if sheets is not None else EMPTY_WORKBOOK).items()
+        }
+
+    def _request(self):
+        self.requests += 1
+        count_api_call('memory')
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and self.random.random() < self.error_rate:
+            raise ConnectionError("Injected storage failure")
+
+    def _sheet(self, sheet):
+        if sheet not in self.sheets:
+            raise WorksheetNotFound(sheet)
+        return self.sheets[sheet]
+
+    def _save(self):
+        if not self.path:
+            return
+        # Write under another name first so a crash never leaves half a file
+        with open(self.path + '.part', 'w', encoding='utf-8') as file:
+            json.dump(self.sheets, file)
+        os.replace(self.path + '.part', self.path)
+
+    def _data_rows(self, rows):
+        # Rows up to the last one holding data, as append finds the end of a table
+        count = len(rows)
+        while count and not any(rows[count - 1]):
+            count -= 1
+        return count
+
+    def _set(self, rows, row, col, text):
+        while len(rows) < row:
+            rows.append([])
+        cells = rows[row - 1]
+        cells.extend([''] * (col - len(cells)))
+        cells[col - 1] = text
+
+    def fetch_columns(self, ranges):
+        with self.lock:
+            self._request()
+            results = []
+            for a1_range in ranges:
+                sheet, _, cells = a1_range.partition('!')
+                rows = self._sheet(sheet)
+                grid = a1_range_to_grid_range(cells) if cells else {}
+                block = rows[grid.get('startRowIndex', 0):grid.get('endRowIndex', len(rows))]
+                if 'startColumnIndex' in grid or 'endColumnIndex' in grid:
+                    block = [row[grid.get('startColumnIndex', 0):grid.get('endColumnIndex')] for row in block]
+                columns = [list(column) for column in zip_longest(*block, fillvalue='')]
+                for column in columns:
+                    while column and column[-1] == '':
+                        column.pop()
+                while columns and not columns[-1]:
+                    columns.pop()
+                results.append(columns)
+            return results
+
+    def open_sheets(self, sheets):
+        with self.lock:
+            for sheet in sheets:
+                self._sheet(sheet)
+
+    def header(self, sheet):
+        with self.lock:
+            self._request()
+            rows = self._sheet(sheet)
+            return list(rows[0]) if rows else []
+
+    def add_columns(self, sheet, position, names):
+        with self.lock:
+            self._request()
+            rows = self._sheet(sheet)
+            for offset, name in enumerate(names):
+                self._set(rows, 1, position + offset, str(name))
+            self._save()
+
+    def append_rows(self, sheet, rows):
+        with self.lock:
+            self._request()
+            sheet_rows = self._sheet(sheet)
+            row_number = self._data_rows(sheet_rows) + 1
+            del sheet_rows[row_number - 1:]
+            sheet_rows.extend([self._raw_text(value) for value in row] for row in rows)
+            self._save()
+            return row_number
+
+    def append_rows_atomically(self, rows_by_sheet):
+        with self.lock:
+            self._request()
+            for sheet in rows_by_sheet:
+                self._sheet(sheet)  # Check them all before changing anything
+            for sheet, rows in rows_by_sheet.items():
+                sheet_rows = self.sheets[sheet]
+                del sheet_rows[self._data_rows(sheet_rows):]
+                sheet_rows.extend([self._raw_text(value) for value in row] for row in rows)
+            self._save()
+
+    def update_cells(self, sheet, cells):
+        with self.lock:
+            self._request()
+            rows = self._sheet(sheet)
+            for row, col, value in cells:
+                text = str(value)
+                self._set(rows, row, col, _number_text(text) if _NUMBER.match(text) else text)
+            self._save()
+
+    def find_row(self, sheet, column, value):
+        with self.lock:
+            self._request()
+            rows = self._sheet(sheet)
+            if not rows or column not in rows[0]:
+                return None
+            col = rows[0].index(column)
+            for number, row in enumerate(rows[1:], 2):
+                if col < len(row) and row[col] == str(value):
+                    return number
+            return None
+
+    def create_sheet(self, sheet, rows):
+        with self.lock:
+            self._request()
+            if sheet in self.sheets:
+                raise WorksheetExists(sheet)
+            self.sheets[sheet] = [[self._raw_text(value) for value in row] for row in rows]
+            self._save()
+
+    def read_cell(self, sheet, row, col):
+        with self.lock:
+            self._request()
+            rows = self._sheet(sheet)
+            if row > len(rows) or col > len(rows[row - 1]):
+                return ''
+            return rows[row - 1][col - 1]
+
+    def replace_cell(self, sheet, row, col, expected, new):
+        with self.lock:
+            self._request()
+            rows = self._sheet(sheet)
+            if row > len(rows) or col > len(rows[row - 1]) or rows[row - 1][col - 1] != str(expected):
+                return False
+            rows[row - 1][col - 1] = str(new)
+            self._save()
+            return True
+
+    @staticmethod
+    def _raw_text(value):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return _number_text(value)
+        return str(value)
+
+
+@st.cache_resource(show_spinner=False)
+def get_storage():
+    """
+    Returns the storage backend picked by the [storage] backend setting,
+    shared by every session of this server process.
+    """
+    if STORAGE_BACKEND == 'memory':
+        return MemoryBackend(
+            path=MEMORY_PATH or None,
+            latency=MEMORY_LATENCY_MS / 1000,
+            error_rate=MEMORY_ERROR_RATE
+        )
+    if STORAGE_BACKEND != 'sheets':
+        raise ValueError(f"Unknown storage backend '{STORAGE_BACKEND}', expected 'sheets' or 'memory'.")
+    return SheetsBackend()
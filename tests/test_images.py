@@ -0,0 +1,115 @@
+"""
+Tests of the photo upload against a local stand-in for the Cloudinary
+upload endpoint.
+
+Usage:
+    python -m pytest tests
+"""
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+from email.parser import BytesParser
+from email.policy import default
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import cloudinary
+import pytest
+from PIL import Image, UnidentifiedImageError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from images import upload_photo  # noqa: E402
+
+
+class _UploadEndpoint(BaseHTTPRequestHandler):
+    """Records every multipart upload request and answers like Cloudinary."""
+
+    requests = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        message = BytesParser(policy=default).parsebytes(
+            b'Content-Type: ' + self.headers['Content-Type'].encode() + b'\r\n\r\n' + body
+        )
+        fields = {
+            part.get_param('name', header='content-disposition'): (part.get_filename(), part.get_payload(decode=True))
+            for part in message.iter_parts()
+        }
+        self.requests.append({'path': self.path, 'content_type': message.get_content_type(), 'fields': fields})
+
+        response = json.dumps({'url': 'http://res.cloudinary.com/demo/image/upload/v1/gym_members/p.jpg', 'public_id': 'gym_members/p'}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def upload_endpoint():
+    _UploadEndpoint.requests = []
+    server = HTTPServer(('127.0.0.1', 0), _UploadEndpoint)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    cloudinary.config(
+        cloud_name='demo', api_key='key', api_secret='secret',
+        upload_prefix=f'http://127.0.0.1:{server.server_port}'
+    )
+    yield _UploadEndpoint.requests
+    server.shutdown()
+    thread.join()
+
+
+@pytest.fixture
+def temp_dir(tmp_path, monkeypatch):
+    # Point tempfile at an empty directory, so any file left behind shows,
+    # and fail outright if the upload goes through a temporary file at all
+    directory = tmp_path / 'tmp'
+    directory.mkdir()
+    monkeypatch.setattr(tempfile, 'tempdir', str(directory))
+
+    def refuse(*args, **kwargs):
+        raise AssertionError("The upload must not write a temporary file")
+    for name in ('NamedTemporaryFile', 'TemporaryFile', 'SpooledTemporaryFile', 'mkstemp'):
+        monkeypatch.setattr(tempfile, name, refuse)
+    return directory
+
+
+def _photo(size, mode='RGBA'):
+    photo = io.BytesIO()
+    Image.new(mode, size, (10, 200, 10, 128) if mode == 'RGBA' else (10, 200, 10)).save(photo, 'PNG')
+    photo.seek(0)
+    return photo
+
+
+def test_upload_sends_one_prepared_jpeg(upload_endpoint, temp_dir):
+    result, stats = upload_photo(_photo((2000, 3000)))
+
+    assert result['public_id'] == 'gym_members/p'
+    assert len(upload_endpoint) == 1
+    request = upload_endpoint[0]
+    assert request['path'] == '/v1_1/demo/image/upload'
+    assert request['content_type'] == 'multipart/form-data'
+    assert request['fields']['folder'] == (None, b'gym_members')
+
+    file_name, data = request['fields']['file']
+    assert file_name == 'photo.jpg'
+    assert data[:2] == b'\xff\xd8'  # JPEG
+    assert len(data) == stats['prepared_bytes']
+    assert Image.open(io.BytesIO(data)).size == stats['size'] == (533, 800)
+    assert list(temp_dir.iterdir()) == []
+
+
+def test_upload_writes_no_temporary_file_on_failure(upload_endpoint, temp_dir):
+    # A photo that cannot be decoded fails before any request
+    with pytest.raises(UnidentifiedImageError):
+        upload_photo(io.BytesIO(b'not an image'))
+
+    assert upload_endpoint == []
+    assert list(temp_dir.iterdir()) == []
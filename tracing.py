@@ -0,0 +1,297 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from functools import wraps
+import streamlit as st
+from config import get_setting
+
+# Off by default. When off, traced() returns functions unchanged and span()
+# returns a shared no-op context, so instrumented code pays nothing.
+TRACING_ENABLED = get_setting("tracing", "enabled", False)
+TRACE_HISTORY = get_setting("tracing", "history", 20)
+# Optional exporters: every finished rerun is appended to a JSON-lines file,
+# and the running totals are written to a Prometheus text file (e.g. for the
+# node_exporter textfile collector)
+TRACE_LOG_PATH = get_setting("tracing", "log_path", "")
+TRACE_PROMETHEUS_PATH = get_setting("tracing", "prometheus_path", "")
+# Usernames allowed to see the panel, comma separated; defaults to the
+# [auth] account
+TRACE_ADMINS = get_setting("tracing", "admins", "")
+
+_NO_SPAN = nullcontext()
+_current = threading.local()  # Trace of the rerun running on this thread
+
+
+class _Recorder:
+    """Recent rerun traces and running totals, shared by every session."""
+
+    def __init__(self, history):
+        self.lock = threading.Lock()
+        self.reruns = deque(maxlen=history)
+        self.span_totals = {}  # Span name -> [count, seconds]
+        self.rerun_count = 0
+        self.api_calls = {}  # Service -> [calls, bytes sent, bytes received]
+
+    def add_span(self, name, seconds):
+        with self.lock:
+            totals = self.span_totals.setdefault(name, [0, 0.0])
+            totals[0] += 1
+            totals[1] += seconds
+
+    def add_api_call(self, service, sent, received):
+        with self.lock:
+            totals = self.api_calls.setdefault(service, [0, 0, 0])
+            totals[0] += 1
+            totals[1] += sent
+            totals[2] += received
+
+    def add_rerun(self, trace):
+        with self.lock:
+            self.reruns.append(trace)
+            self.rerun_count += 1
+
+    def prometheus_text(self):
+        with self.lock:
+            lines = [
+                "# HELP brotot_reruns_total Page reruns traced.",
+                "# TYPE brotot_reruns_total counter",
+                f"brotot_reruns_total {self.rerun_count}",
+                "# HELP brotot_span_calls_total Calls of each traced block.",
+                "# TYPE brotot_span_calls_total counter"
+            ]
+            lines += [f'brotot_span_calls_total{{span="{name}"}} {count}' for name, (count, _) in sorted(self.span_totals.items())]
+            lines += [
+                "# HELP brotot_span_seconds_total Wall time spent in each traced block.",
+                "# TYPE brotot_span_seconds_total counter"
+            ]
+            lines += [f'brotot_span_seconds_total{{span="{name}"}} {seconds:.6f}' for name, (_, seconds) in sorted(self.span_totals.items())]
+            for metric, position, help_text in (
+                ('brotot_api_calls_total', 0, "Requests made to external services."),
+                ('brotot_api_sent_bytes_total', 1, "Bytes sent to external services."),
+                ('brotot_api_received_bytes_total', 2, "Bytes received from external services.")
+            ):
+                lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+                lines += [f'{metric}{{service="{service}"}} {totals[position]}' for service, totals in sorted(self.api_calls.items())]
+            return '\n'.join(lines) + '\n'
+
+
+@st.cache_resource(show_spinner=False)
+def _recorder():
+    return _Recorder(TRACE_HISTORY)
+
+
+@contextmanager
+def _span(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        _recorder().add_span(name, seconds)
+        trace = getattr(_current, 'trace', None)
+        if trace is not None:
+            totals = trace['spans'].setdefault(name, {'count': 0, 'ms': 0.0})
+            totals['count'] += 1
+            totals['ms'] += seconds * 1000
+
+
+def span(name):
+    """
+    Context manager timing a block as part of the current rerun's trace.
+
+    Args:
+        name (str): Block name shown in the panel, e.g. 'render_cards'.
+    """
+    return _span(name) if TRACING_ENABLED else _NO_SPAN
+
+
+def traced(name=None):
+    """
+    Decorator timing every call of a function, see span().
+
+    Args:
+        name (str): Span name, defaults to the function name.
+    """
+    def decorate(func):
+        if not TRACING_ENABLED:
+            return func
+        span_name = name or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with _span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def count_api_call(service, sent=0, received=0):
+    """
+    Counts a request to an external service against the current rerun.
+
+    Args:
+        service (str): e.g. 'sheets' or 'cloudinary'.
+        sent (int): Request body size in bytes.
+        received (int): Response body size in bytes.
+    """
+    if not TRACING_ENABLED:
+        return
+    _recorder().add_api_call(service, sent, received)
+    trace = getattr(_current, 'trace', None)
+    if trace is not None:
+        trace['api_calls'] += 1
+        trace['bytes_sent'] += sent
+        trace['bytes_received'] += received
+
+
+def bind_trace(func):
+    """
+    Makes func count against the current rerun's trace when it runs on
+    another thread, e.g. in a ThreadPoolExecutor.
+    """
+    if not TRACING_ENABLED:
+        return func
+    trace = getattr(_current, 'trace', None)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        previous = getattr(_current, 'trace', None)
+        _current.trace = trace
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current.trace = previous
+    return wrapper
+
+
+def count_http_responses(session, service):
+    """Counts every request made through a requests.Session, e.g. gspread's."""
+    if not TRACING_ENABLED:
+        return
+
+    def count_response(response, *args, **kwargs):
+        body = response.request.body
+        sent = len(body) if isinstance(body, (bytes, str)) else 0
+        count_api_call(service, sent, len(response.content or b''))
+    session.hooks['response'].append(count_response)
+
+
+@contextmanager
+def _trace(page):
+    if not TRACING_ENABLED:
+        yield
+        return
+    trace = {
+        'started_at': time.time(),
+        'page': page,
+        'wall_ms': 0.0,
+        'api_calls': 0,
+        'bytes_sent': 0,
+        'bytes_received': 0,
+        'spans': {}
+    }
+    previous = getattr(_current, 'trace', None)
+    _current.trace = trace
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        # st.rerun() and st.stop() end the run with an exception: still record it
+        trace['wall_ms'] = (time.perf_counter() - start) * 1000
+        _current.trace = previous
+        recorder = _recorder()
+        recorder.add_rerun(trace)
+        _export(recorder, trace)
+
+
+def rerun_trace():
+    """
+    Collects the spans and API calls of one script run into a trace,
+    recorded (and exported) when the run ends.
+    """
+    return _trace(None)
+
+
+def background_trace(name):
+    """
+    Like rerun_trace(), for work done outside any script run, e.g. writes
+    flushed by a background thread after the rerun that queued them ended.
+    It is listed with the reruns, with name as its page.
+    """
+    return _trace(name)
+
+
+def set_page(page):
+    """Names the page of the current rerun's trace."""
+    trace = getattr(_current, 'trace', None)
+    if trace is not None:
+        trace['page'] = page
+
+
+def _export(recorder, trace):
+    try:
+        if TRACE_LOG_PATH:
+            with open(TRACE_LOG_PATH, 'a', encoding='utf-8') as file:
+                file.write(json.dumps(trace) + '\n')
+        if TRACE_PROMETHEUS_PATH:
+            # Replace the file at once so a scrape never reads half of it
+            with open(TRACE_PROMETHEUS_PATH + '.part', 'w', encoding='utf-8') as file:
+                file.write(recorder.prometheus_text())
+            os.replace(TRACE_PROMETHEUS_PATH + '.part', TRACE_PROMETHEUS_PATH)
+    except OSError:
+        pass  # Monitoring must never break the page
+
+
+def is_admin(username):
+    """Tells whether a logged-in user may see the tracing panel."""
+    admins = [name.strip() for name in TRACE_ADMINS.split(',') if name.strip()]
+    if not admins:
+        admins = [st.secrets["auth"]["username"]]
+    return username in admins
+
+
+def render_panel():
+    """Shows the last reruns' traces in the sidebar, with exports to download."""
+    import pandas as pd  # Only needed here; the rest of this module loads at login
+
+    recorder = _recorder()
+    with recorder.lock:
+        reruns = list(recorder.reruns)
+    with st.sidebar.expander("Performance traces"):
+        if not reruns:
+            st.caption("No reruns traced yet.")
+            return
+        st.dataframe(
+            pd.DataFrame([
+                {
+                    'Time': datetime.fromtimestamp(trace['started_at']).strftime('%H:%M:%S'),
+                    'Page': trace['page'],
+                    'Wall ms': round(trace['wall_ms'], 1),
+                    'API calls': trace['api_calls'],
+                    'KB': round((trace['bytes_sent'] + trace['bytes_received']) / 1024, 1)
+                }
+                for trace in reversed(reruns)
+            ]),
+            hide_index=True,
+            use_container_width=True
+        )
+        latest = reruns[-1]
+        st.caption("Latest rerun, by block:")
+        st.dataframe(
+            pd.DataFrame([
+                {'Block': name, 'Calls': totals['count'], 'ms': round(totals['ms'], 1)}
+                for name, totals in sorted(latest['spans'].items(), key=lambda item: -item[1]['ms'])
+            ]),
+            hide_index=True,
+            use_container_width=True
+        )
+        st.download_button(
+            "Download JSON lines",
+            ''.join(json.dumps(trace) + '\n' for trace in reruns),
+            file_name="traces.jsonl"
+        )
+        st.download_button("Download Prometheus metrics", recorder.prometheus_text(), file_name="metrics.prom")
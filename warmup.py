@@ -0,0 +1,46 @@
+import logging
+import threading
+import time
+import streamlit as st
+from config import get_setting
+
+# Optional: load, process and index the tables on a background thread as
+# soon as the server gets its first visitor (usually while the login form is
+# shown), and keep them no older than WARMUP_INTERVAL_SECONDS, so the first
+# page after login renders from warm data.
+WARMUP_ENABLED = get_setting("warmup", "enabled", False)
+WARMUP_INTERVAL_SECONDS = get_setting("warmup", "interval_seconds", 60)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def warm_up():
+    """Builds the shared client, tables, processed member data and search index."""
+    # Imported here: this module loads with the login form, which must stay light
+    from data import refresh_member_data
+    from membership import get_processed_member_data
+    from search import get_search_index
+    from storage import get_storage
+
+    refresh_member_data(WARMUP_INTERVAL_SECONDS)
+    get_processed_member_data()
+    get_search_index()
+    get_storage().open_sheets(['Members', 'Transactions'])
+
+
+def _warm_forever():
+    while True:
+        start = time.monotonic()
+        try:
+            warm_up()
+        except Exception:
+            _LOGGER.exception("Could not warm up the member data")
+        time.sleep(max(1.0, WARMUP_INTERVAL_SECONDS - (time.monotonic() - start)))
+
+
+@st.cache_resource(show_spinner=False)
+def start_warmup():
+    """Starts the warm-up thread, once per server process."""
+    thread = threading.Thread(target=_warm_forever, name="warmup", daemon=True)
+    thread.start()
+    return thread